@@ -0,0 +1,66 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+_SPACES = re.compile(r"\s+")
+
+
+def cache_key(prompt, context=""):
+    """
+    Prompts that only differ in case or whitespace share an entry.
+    """
+    key = _SPACES.sub(" ", prompt.lower()).strip()
+    if context:
+        key += "\0" + str(context)
+    return key
+
+
+class ResponseCache:
+    """
+    Bounded LRU of AI responses whose entries expire after `ttl` seconds. A ttl of 0 turns the cache off.
+    """
+
+    def __init__(self, maxsize=1024, ttl=3600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.maxsize > 0
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "size": len(self._entries)}
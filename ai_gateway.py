@@ -0,0 +1,280 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+
+class AIProviderError(Exception):
+    """Raised by a provider call that returned nothing usable."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` failures in a row and lets a single trial call through once `cooldown` seconds have passed.
+    """
+
+    def __init__(self, threshold=5, cooldown=30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def release(self):
+        """
+        Gives up a half-open trial that ended without a verdict, so a later call can make the trial instead.
+        """
+        with self._lock:
+            self._trial = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+class Provider:
+    """
+    One AI backend. `call(text, timeout)` returns the reply or raises; `acall` is the asyncio equivalent.
+    """
+
+    def __init__(self, name, call, acall=None, breaker=None, window=200):
+        self.name = name
+        self.call = call
+        self.acall = acall
+        self.breaker = breaker or CircuitBreaker()
+        self.latencies = deque(maxlen=window)
+        self.counts = {"selected": 0, "calls": 0, "errors": 0, "timeouts": 0, "hedges": 0, "wins": 0}
+        self._lock = threading.Lock()
+
+    def percentile(self, q):
+        with self._lock:
+            samples = sorted(self.latencies)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def record(self, seconds, ok):
+        with self._lock:
+            self.counts["calls"] += 1
+            if ok:
+                self.latencies.append(seconds)
+            else:
+                self.counts["errors"] += 1
+        if ok:
+            self.breaker.success()
+        else:
+            self.breaker.failure()
+
+
+class AIGateway:
+    """
+    Routes AI requests across providers, weighted towards whichever has had the lower recent p95 latency.
+    Each request has an overall deadline; a failed or broken provider fails over to the next one,
+    and with hedge_after set a second provider is also asked if the first hasn't answered by then.
+    """
+
+    # Assumed p95 for a provider with too few samples to judge
+    DEFAULT_P95 = 2.0
+    MIN_SAMPLES = 5
+
+    def __init__(self, providers, deadline=20.0, hedge_after=None, fallback=""):
+        self.providers = providers
+        self.deadline = deadline
+        self.hedge_after = hedge_after
+        self.fallback = fallback
+        self._pool = ThreadPoolExecutor(max_workers=8 * len(providers), thread_name_prefix="ai")
+
+    def _expected(self, provider):
+        if len(provider.latencies) < self.MIN_SAMPLES:
+            return self.DEFAULT_P95
+        return max(provider.percentile(0.95), 0.001)
+
+    def route(self):
+        """
+        Providers in the order to try them: a weighted shuffle by 1 / p95, skipping open breakers.
+        """
+        candidates = [p for p in self.providers if p.breaker.state != "open"] or list(self.providers)
+        order = []
+        weights = [1 / self._expected(p) for p in candidates]
+        while candidates:
+            i = random.choices(range(len(candidates)), weights)[0]
+            order.append(candidates.pop(i))
+            weights.pop(i)
+        return order
+
+    def _timed(self, provider, text, timeout):
+        start = time.monotonic()
+        try:
+            result = provider.call(text, timeout)
+            if not result:
+                raise AIProviderError(f"{provider.name} returned an empty response")
+        except Exception:
+            provider.record(time.monotonic() - start, False)
+            raise
+        provider.record(time.monotonic() - start, True)
+        return result
+
+    async def _atimed(self, provider, text, timeout):
+        start = time.monotonic()
+        try:
+            result = await asyncio.wait_for(provider.acall(text, timeout), timeout)
+            if not result:
+                raise AIProviderError(f"{provider.name} returned an empty response")
+        except Exception:
+            provider.record(time.monotonic() - start, False)
+            raise
+        except asyncio.CancelledError:
+            # Lost a hedge or outlived the deadline (arequest records that as a failure): no verdict here,
+            # but a half-open trial mustn't stay taken or the breaker never closes again
+            provider.breaker.release()
+            raise
+        provider.record(time.monotonic() - start, True)
+        return result
+
+    def _next(self, order):
+        while order:
+            provider = order.pop(0)
+            if provider.breaker.allow():
+                return provider
+        return None
+
+    def request(self, text):
+        order = self.route()
+        deadline = time.monotonic() + self.deadline
+        in_flight = {}
+
+        def launch(hedge=False):
+            provider = self._next(order)
+            if provider is None:
+                return False
+            provider.count("hedges" if hedge else "selected")
+            in_flight[self._pool.submit(self._timed, provider, text, deadline - time.monotonic())] = provider
+            return True
+
+        launch()
+        hedge_at = time.monotonic() + self.hedge_after if self.hedge_after else None
+        while in_flight:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            until = min(deadline, hedge_at) if hedge_at else deadline
+            done, _ = wait(in_flight, timeout=max(0, until - now), return_when=FIRST_COMPLETED)
+            for future in done:
+                provider = in_flight.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.warning(f"AI provider {provider.name} failed: {e}")
+                    if not in_flight:
+                        launch()
+                    continue
+                provider.count("wins")
+                return result
+            if not done and hedge_at and time.monotonic() >= hedge_at:
+                hedge_at = None
+                launch(hedge=True)
+        for provider in in_flight.values():
+            provider.count("timeouts")
+        logger.error("No AI provider answered in time")
+        return self.fallback
+
+    async def arequest(self, text):
+        order = self.route()
+        deadline = time.monotonic() + self.deadline
+        in_flight = {}
+
+        def launch(hedge=False):
+            provider = self._next(order)
+            if provider is None:
+                return False
+            provider.count("hedges" if hedge else "selected")
+            task = asyncio.ensure_future(self._atimed(provider, text, deadline - time.monotonic()))
+            in_flight[task] = provider
+            return True
+
+        launch()
+        hedge_at = time.monotonic() + self.hedge_after if self.hedge_after else None
+        try:
+            while in_flight:
+                now = time.monotonic()
+                if now >= deadline:
+                    break
+                until = min(deadline, hedge_at) if hedge_at else deadline
+                done, _ = await asyncio.wait(in_flight, timeout=max(0, until - now), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    provider = in_flight.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        logger.warning(f"AI provider {provider.name} failed: {e}")
+                        if not in_flight:
+                            launch()
+                        continue
+                    provider.count("wins")
+                    return result
+                if not done and hedge_at and time.monotonic() >= hedge_at:
+                    hedge_at = None
+                    launch(hedge=True)
+            for provider in in_flight.values():
+                provider.count("timeouts")
+                # Cancelled below, so it never records an outcome itself; a sync call would have timed out and failed
+                provider.record(self.deadline, False)
+            logger.error("No AI provider answered in time")
+            return self.fallback
+        finally:
+            # The loser of a hedge is not needed any more
+            for task in in_flight:
+                task.cancel()
+
+    def snapshot(self):
+        """
+        Per-provider counters, latency percentiles and breaker state.
+        """
+        stats = {}
+        for provider in self.providers:
+            with provider._lock:
+                counts = dict(provider.counts)
+            stats[provider.name] = {
+                **counts,
+                "p50": provider.percentile(0.5),
+                "p95": provider.percentile(0.95),
+                "breaker": provider.breaker.state,
+            }
+        return stats
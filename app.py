@@ -1,116 +1,266 @@
-import dbm
-import json
+import atexit
 import logging
 import os
-import random
 import re
+import threading
 import time
-from threading import RLock
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 from dotenv import load_dotenv
-from openai import OpenAI
-import google.generativeai as genai
-from slack_bolt import App
+from slack_bolt import App, BoltResponse
 from slack_bolt.adapter.socket_mode import SocketModeHandler
 from slack_sdk.errors import SlackApiError
 
+from ai_cache import ResponseCache, cache_key
+from ai_gateway import AIGateway, AIProviderError, Provider
+from compact import BannedWordSets
+from dedup import DedupCache, event_key
+from intents import classify_intent
+from leaderboard import ScoreIndex
+from matcher import EMPTY_MATCHER, shared_matcher
+import metrics
+from normaliser import normalise
+from outbound import OutboundDispatcher
+from ratelimit import slack_bucket
+from reflections import ReflectionScheduler
+from score_journal import ScoreJournal
+from score_store import CompactScoreStore, ScoreStore
+from snapshot import with_snapshot
+from storage import open_storage, reflection_key
+from sweep import HistorySweeper
+
 load_dotenv()
 
 # --- Reflection and Score Caches (thread-safe) ---
 reflection_channel_id = ""
-reflections_cache = []
-scores_cache = {}
-scores_lock = RLock()
-reflections_lock = RLock()
-
-
-# Load all unprocessed reflections into memory
-def load_pending_reflections():
-    loaded = []
-    with dbm.open("reflections.db", "c") as db:
-        for key in db.keys():
-            record = json.loads(db[key].decode())
-            if not record.get("processed", False):
-                loaded.append(record)
-    return loaded
-
-
-def load_scores():
-    loaded = {}
-    with dbm.open("scores.db", "c") as db:
-        for k, v in db.items():
-            loaded[k.decode()] = int(v)
-    return loaded
-
-
-reflections_cache = load_pending_reflections()
-scores_cache = load_scores()
+reflections_cache = {}
+# Live vote tallies for open reflections: voters per reaction by reflection key, and the reflection behind each
+# voting message so reaction events can find it. Keys in stale_tallies may have missed votes while we were down.
+vote_tallies = {}
+reflections_by_message = {}
+stale_tallies = set()
+# With METRICS_PORT set these record wait and hold times; otherwise they are plain RLocks
+reflections_lock = metrics.lock("reflections")
+
+
+# All persistence (banned words, scores, reflections) goes through this; see storage.py.
+# Changes are also logged next to a periodic snapshot so restarts don't read the whole database; see snapshot.py.
+storage = metrics.instrument_storage(with_snapshot(open_storage()))
+atexit.register(storage.close)
+
+# Wakes the reflection worker when each pending reflection's vote closes
+reflection_scheduler = ReflectionScheduler()
+# The caches are filled from storage in the background (see load_caches) so the socket connection isn't held up.
+# Listeners wait on this before touching them.
+caches_ready = threading.Event()
+# Score writes go through the journal so the message path never waits on storage.
+# SCORE_FLUSH_MS is the most recent history we can lose on a crash; 0 writes through on every change.
+score_journal = ScoreJournal(
+    storage.write_scores,
+    max_loss_ms=int(os.environ.get("SCORE_FLUSH_MS", "1000")),
+    max_batch=int(os.environ.get("SCORE_FLUSH_BATCH", "100")),
+)
+atexit.register(score_journal.close)
 
 # Initialises your app with your bot token and socket mode handler
 app = App(
     token=os.environ.get("SLACK_BOT_TOKEN"),
+    # Benchmarks and offline tools set SLACK_TOKEN_VERIFICATION=0 to skip the auth.test call
+    token_verification_enabled=os.environ.get("SLACK_TOKEN_VERIFICATION", "1") != "0",
 )
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Slack redelivers an event when our ack is slow. Each delivery would be scanned and penalised again, so events seen
+# in the last DEDUP_TTL seconds are dropped. DEDUP_PATH keeps the record across restarts.
+dedup = DedupCache(
+    ttl=int(os.environ.get("DEDUP_TTL", "600")),
+    maxsize=int(os.environ.get("DEDUP_SIZE", "100000")),
+    path=os.environ.get("DEDUP_PATH") or None,
+)
+atexit.register(dedup.close)
+
+
+@app.middleware
+def drop_redeliveries(body, next):
+    key = event_key(body)
+    if key is not None and dedup.seen(key):
+        logger.info("Dropped redelivered event %s", key)
+        return BoltResponse(status=200, body="")
+    next()
+
 # Akaalroop Intelligence trust trust
 
 AI_TOKEN1 = os.environ.get("AI_TOKEN1")
 AI_TOKEN2 = os.environ.get("AI_TOKEN2")
 DEFAULT_PROMPT = "You are a bot called Word Ban. You are open source and your code is at https://github.com/Spacexplorer11/Word_BAN/ You are used to ban words in a Slack channel. Your creator is Akaalroop. He is 'spacexplorer11' on GitHub. His user id is 'U08D22QNUVD'. You can mention him by sending '<@U08D22QNUVD>'. You have a teenage boy personality. The user has given a prompt to you. Please respond appropriately as your response will be sent directly, word for word, to the user. Please keep responses short and conscise. Please use slack mrkdwn."
 
-client1 = OpenAI(
-    api_key=AI_TOKEN1,
-    base_url="https://ai.hackclub.com/proxy/v1"
-)
 
-genai.configure(api_key=AI_TOKEN2)
-model = genai.GenerativeModel("gemini-3-flash-preview")
+# The AI SDKs (Gemini's pulls in grpc and protobuf) are slow to import and only needed for mentions,
+# so they are imported and their clients built on first use.
+@lru_cache(maxsize=None)
+def openai_client():
+    from openai import OpenAI
+    return OpenAI(api_key=AI_TOKEN1, base_url="https://ai.hackclub.com/proxy/v1")
 
 
-def ai_request(prompt, context=""):
-    whichClient = random.randint(1, 2)
-    if whichClient == 1:
-        response = client1.chat.completions.create(
-            model="google/gemini-3-flash-preview",
-            messages=[
-                {"role": "assistant",
-                 "content": f"{DEFAULT_PROMPT} User Prompt (+ a bit extra user metadata): {prompt} The last 10 messages in a list are: {context} Please use these to adjust your output and how you respond."}
-            ]
-        )
-        return response.choices[0].message.content
-    elif whichClient == 2:
-        response = model.generate_content(
-            f"{DEFAULT_PROMPT} User Prompt (+ a bit extra user metadata): {prompt} The last 10 messages in a list are: {context} Please use these to adjust your output and how you respond.")
-        if response.candidates:
-            return response.candidates[0].content.parts[0].text
-        else:
-            return "I'm sorry, I couldn't generate a response at this time."
-    else:
-        return "I'm sorry, I couldn't generate a response at this time."
+@lru_cache(maxsize=None)
+def async_openai_client():
+    from openai import AsyncOpenAI
+    return AsyncOpenAI(api_key=AI_TOKEN1, base_url="https://ai.hackclub.com/proxy/v1")
 
 
-# --- Initialise in-memory caches once ---
-# Thread-safe lock for banned words cache
-banned_lock = RLock()
+@lru_cache(maxsize=None)
+def gemini_model():
+    import google.generativeai as genai
+    genai.configure(api_key=AI_TOKEN2)
+    return genai.GenerativeModel("gemini-3-flash-preview")
+
+
+AI_FALLBACK = "I'm sorry, I couldn't generate a response at this time."
+
+
+def build_ai_prompt(prompt, context=""):
+    return f"{DEFAULT_PROMPT} User Prompt (+ a bit extra user metadata): {prompt} The last 10 messages in a list are: {context} Please use these to adjust your output and how you respond."
+
+
+def hackclub_request(text, timeout):
+    response = openai_client().chat.completions.create(
+        model="google/gemini-3-flash-preview",
+        messages=[
+            {"role": "assistant",
+             "content": text}
+        ],
+        timeout=timeout
+    )
+    return response.choices[0].message.content
+
+
+async def hackclub_request_async(text, timeout):
+    response = await async_openai_client().chat.completions.create(
+        model="google/gemini-3-flash-preview",
+        messages=[
+            {"role": "assistant",
+             "content": text}
+        ],
+        timeout=timeout
+    )
+    return response.choices[0].message.content
+
+
+def gemini_text(response):
+    if not response.candidates:
+        raise AIProviderError("Gemini returned no candidates")
+    return response.candidates[0].content.parts[0].text
+
+
+def gemini_request(text, timeout):
+    return gemini_text(gemini_model().generate_content(text, request_options={"timeout": timeout}))
 
 
-def mark_reflection_processed(key: str):
-    with dbm.open("reflections.db", "c") as db:
-        if key.encode() in db:
-            record = json.loads(db[key].decode())
-            record["processed"] = True
-            db[key] = json.dumps(record)
+async def gemini_request_async(text, timeout):
+    return gemini_text(await gemini_model().generate_content_async(text, request_options={"timeout": timeout}))
 
 
-def generate_leaderboard_blocks(scores: dict) -> list:
+# Routes between the two providers by recent latency, with per-call deadlines, failover and circuit breaking.
+# AI_HEDGE_MS > 0 also asks the other provider when the first is slower than that.
+ai_gateway = AIGateway(
+    [
+        Provider("hackclub", hackclub_request, hackclub_request_async),
+        Provider("gemini", gemini_request, gemini_request_async),
+    ],
+    deadline=int(os.environ.get("AI_DEADLINE_MS", "20000")) / 1000,
+    hedge_after=int(os.environ.get("AI_HEDGE_MS", "0")) / 1000 or None,
+    fallback=AI_FALLBACK,
+)
+
+
+# Separate response caches for intent classification (same few phrases, safe to keep) and chat replies (off by default)
+ai_caches = {
+    "classify": ResponseCache(
+        maxsize=int(os.environ.get("AI_CACHE_CLASSIFY_SIZE", "1024")),
+        ttl=int(os.environ.get("AI_CACHE_CLASSIFY_TTL", "86400")),
+    ),
+    "chat": ResponseCache(
+        maxsize=int(os.environ.get("AI_CACHE_CHAT_SIZE", "256")),
+        ttl=int(os.environ.get("AI_CACHE_CHAT_TTL", "0")),
+    ),
+}
+
+
+def ai_request(prompt, context="", kind="chat"):
+    cache = ai_caches[kind]
+    key = cache_key(prompt, context)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    response = ai_gateway.request(build_ai_prompt(prompt, context))
+    if response != AI_FALLBACK:
+        cache.put(key, response)
+    return response
+
+
+async def ai_request_async(prompt, context="", kind="chat"):
+    cache = ai_caches[kind]
+    key = cache_key(prompt, context)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    response = await ai_gateway.arequest(build_ai_prompt(prompt, context))
+    if response != AI_FALLBACK:
+        cache.put(key, response)
+    return response
+
+
+def classification_prompt(text):
+    return f"""Identify if the following prompt is a command the bot can execute or a general message."
+                         Rules: 
+                         Respond with MESSAGE if it's a general message.
+                         Respond with SCORE if they are asking for their score.
+                         Respond with LEADERBOARD if they are asking for the leaderboard.
+                         Respond with BAN_WORD if they are asking to ban a word.
+                         Respond with UNBAN_WORD if they are asking to unban a word.
+                         Respond with BANNED_WORDS if they are asking for the list of banned words.
+                         Respond with REFLECT if they are asking to submit a reflection.
+                         Respond with HELP if they are asking for what you can do or what commands you can execute.
+                         Only respond with one of the above keywords and absolutely NOTHING else.
+                         Prompt: {text}"""
+
+
+# Mention intents that are answered by pointing at the matching slash command
+COMMAND_REPLIES = {
+    "LEADERBOARD": "Please use the `/naughty-leaderboard` command to view the leaderboard.",
+    "BAN_WORD": "To ban a word, please use the `/ban-word` command followed by the word you want to ban.",
+    "UNBAN_WORD": "To unban a word, please use the `/unban-word` command followed by the word you want to unban.",
+    "REFLECT": "To submit a reflection, please run the `/reflect` command",
+    "HELP": "Please check my commands at commands.md here: https://github.com/Spacexplorer11/Word_BAN/blob/main/Commands.md",
+}
+
+
+def persona_prompt(user_id, text):
     """
-    Given a dict of user_id -> score, returns Slack blocks showing top 10 users with their scores and mentions.
+    The chat prompt for a mention, adjusted for the people the bot knows.
     """
-    # Sort by score descending and take top 10
-    sorted_users = sorted(scores.items(), key=lambda x: -x[1], reverse=True)[:10]
+    if user_id == "U08D22QNUVD":
+        return f"User {user_id} said {text}. Refer to them as <@{user_id}> in your final output. This is the creator of you (word ban) please talk to him respectfully and nicely. Please respond as if you are owned by him and serve him."
+    elif user_id == "U097SUCKJ90":
+        return f"User {user_id} said {text}. Refer to them as <@{user_id}> in your final output. This is the best friend of the creator of you (word ban) please talk to him with extreme sass and cheekiness. Please respond in a playful but not hurtful way. He has supported the creator throughout his life and is an amazing person. That said, sass is still welcomed but must be in a playful way. Use context to make the correct decision.."
+    elif user_id == "U09192704Q7":
+        return f"User {user_id} said {text}. Refer to them as <@{user_id}> in your final output. This is a friend of the creator of you (word ban) please talk to him with a touch of sass."
+    return f"User {user_id} said {text}. Respond appropriately to the prompt. Refer to them as <@{user_id}> in your final output."
+
+
+# --- Initialise in-memory caches once ---
+# Thread-safe lock for banned words cache
+banned_lock = metrics.lock("banned")
+
 
+def generate_leaderboard_blocks(sorted_users: list) -> list:
+    """
+    Given the top 10 (user_id, score) pairs in leaderboard order, returns Slack blocks showing them with their scores and mentions.
+    """
     blocks = [
         {
             "type": "header",
@@ -148,50 +298,308 @@ def generate_leaderboard_blocks(scores: dict) -> list:
     return blocks
 
 
-def load_banned_words():
-    with dbm.open("banned_words.db", "c") as db:
-        cache = {}
-        for key in db.keys():
-            decoded = key.decode()
-            if ":" not in decoded:
-                logger.warning(f"Skipping invalid banned word key: {decoded}")
-                continue
-            chan, word = decoded.split(":", 1)
-            cache.setdefault(chan, set()).add(word)
-    return cache
+# Leaderboard order is maintained as scores change; see leaderboard.py
+score_index = ScoreIndex(generate_leaderboard_blocks)
+
 
+def score_changed(user_id, old, new):
+    # Runs under the user's stripe lock, so the index and journal get each user's changes in order
+    score_index.update(user_id, old, new)
+    score_journal.record(user_id, new)
 
-# Thread-safe banned words cache
-banned_words_cache = load_banned_words()
+
+# Every user's score. Updates lock one of SCORE_STRIPES stripes, so different users don't contend; reads don't lock.
+# COMPACT_SCORES=1 trades about a microsecond a lookup for a quarter of the memory, for workspaces with huge user counts.
+score_store = (CompactScoreStore if os.environ.get("COMPACT_SCORES", "0") == "1" else ScoreStore)(
+    score_changed,
+    stripes=int(os.environ.get("SCORE_STRIPES", "64")),
+    lock_factory=lambda: metrics.lock("scores"),
+)
+
+
+def set_score(user_id, new):
+    """
+    Updates a user's score in the store, the leaderboard index and the score journal. Returns the old score.
+    """
+    return score_store.set(user_id, new)
+
+
+# Banned words per channel; each word is stored once and channels with the same bans share a set. Writes hold banned_lock.
+banned_words_cache = BannedWordSets()
+# Compiled matcher per channel, shared between channels with the same words. Entries are immutable and only ever
+# replaced, so readers don't lock. Words are compiled in normalised form so bans made before
+# (or with different folding) still match.
+banned_matchers = {}
+# Set by start_shard_router() when ENFORCE_SHARDS > 1; matching then happens in worker processes
+shard_router = None
+
+
+def rebuild_matcher(channel_id):
+    """
+    Recompiles the channel's matcher from banned_words_cache and swaps it in. Call with banned_lock held.
+    """
+    words = banned_words_cache.get(channel_id)
+    if words:
+        banned_matchers[channel_id] = shared_matcher(normalise(word) for word in words)
+    else:
+        banned_matchers.pop(channel_id, None)
+    if shard_router is not None:
+        shard_router.update(channel_id, banned_matchers.get(channel_id, EMPTY_MATCHER).words)
+
+
+VOTE_REACTIONS = ("upvote", "downvote")
+
+
+def track_votes(record, stale=False):
+    """
+    Starts following the votes on a reflection's message, from the tally saved with it. Call with reflections_lock held.
+    """
+    key = reflection_key(record)
+    votes = record.get("votes") or {}
+    vote_tallies[key] = {name: set(votes.get(name, ())) for name in VOTE_REACTIONS}
+    reflections_by_message[(record["channel"], record["ts"])] = record
+    if stale:
+        stale_tallies.add(key)
+
+
+def untrack_votes(record):
+    """
+    Stops following a settled reflection's votes. Call with reflections_lock held.
+    """
+    key = reflection_key(record)
+    vote_tallies.pop(key, None)
+    stale_tallies.discard(key)
+    if reflections_by_message.get((record["channel"], record["ts"])) is record:
+        del reflections_by_message[(record["channel"], record["ts"])]
+
+
+def save_votes(record):
+    """
+    Copies a reflection's live tally into the record and stores it. Call with reflections_lock held,
+    so saves of the same reflection can't overtake each other.
+    """
+    tally = vote_tallies.get(reflection_key(record))
+    if tally is None:
+        return
+    record["votes"] = {name: sorted(voters) for name, voters in tally.items()}
+    try:
+        storage.save_reflection(record)
+    except Exception as e:
+        logger.error(f"Failed to store votes for reflection {reflection_key(record)}: {e}")
+
+
+def load_caches():
+    """
+    Fills the in-memory caches from storage, then sets caches_ready. Runs once, on a background thread at import.
+    """
+    try:
+        pending_reflections = storage.load_pending_reflections()
+        scores = storage.load_scores()
+        banned = storage.load_banned_words()
+        matchers = {chan: shared_matcher(normalise(word) for word in words) for chan, words in banned.items()}
+    except Exception:
+        # Carrying on with empty caches would overwrite real scores, so let systemd restart us instead
+        logger.exception("Could not load caches from storage")
+        os._exit(1)
+    with reflections_lock:
+        # Unprocessed reflections, indexed by the user who submitted them
+        reflections_cache.update((record["user"], record) for record in pending_reflections)
+        for pending in pending_reflections:
+            # Votes cast while we were down never reached us; the reflection worker re-counts these
+            track_votes(pending, stale=True)
+    for pending in pending_reflections:
+        reflection_scheduler.add(pending)
+    score_store.load(scores)
+    score_index.load(scores)
+    with banned_lock:
+        banned_words_cache.update(banned)
+        banned_matchers.update(matchers)
+    logger.info(f"Loaded {len(scores)} scores, {len(banned)} channels' banned words "
+                f"and {len(pending_reflections)} pending reflections")
+    caches_ready.set()
+
+
+threading.Thread(target=load_caches, name="load-caches", daemon=True).start()
+
+
+@app.middleware
+def wait_for_caches(next):
+    # Only blocks for the first few events after a restart
+    if not caches_ready.is_set():
+        caches_ready.wait()
+    next()
+
+
+def penalise(channel_id, user_id, word):
+    """
+    Takes a point off the user for saying `word`. Returns their new score.
+    """
+    new = score_store.add(user_id, -1)
+    logger.info("Penalised %s for '%s' in %s", user_id, word, channel_id)
+    return new
+
+
+def ensure_score(user_id):
+    """
+    Gives a user who has never been penalised a score of 0, so they show up in storage.
+    """
+    score_store.setdefault(user_id, 0)
+
+
+# Edits and deletions arrive as message events without a top-level user; there's nobody to score for them
+SKIPPED_SUBTYPES = {"message_changed", "message_deleted"}
+
+
+def is_scorable(message):
+    """
+    Whether a message event was said by someone and should be checked against the banned words.
+    """
+    return message.get("user") is not None and message.get("subtype") not in SKIPPED_SUBTYPES
+
+
+def enforce_message(channel_id, user_id, raw_text):
+    """
+    Checks a message against the channel's banned words and updates the sender's score.
+    Returns (word, new score) if they were penalised, otherwise None. Never blocks on I/O.
+    """
+    # Flatten message: lowercase, strip all non-alphanumeric and non-colon characters (removes underscores, dashes, spaces etc.)
+    flattened = normalise(raw_text)
+
+    # Single pass over the message with the channel's current matcher snapshot (no lock needed)
+    word = banned_matchers.get(channel_id, EMPTY_MATCHER).first_match(flattened)
+    if word is not None:
+        return word, penalise(channel_id, user_id, word)
+    ensure_score(user_id)
+    return None
+
+
+# Shortest word (after normalising) that can be banned; emoji like :ok: are allowed whatever their length
+MIN_WORD_LENGTH = 3
+
+
+def is_emoji(word):
+    return len(word) > 2 and word.startswith(":") and word.endswith(":")
+
+
+def penalty_text(word, new):
+    return f":siren-real: The {'emoji' if is_emoji(word) else 'word'} '{word}' is banned! Score: {new}."
+
+
+def penalty_summary(penalties):
+    """
+    One reply for a burst of penalties in a channel. Each penalty is (user_id, word, new score).
+    """
+    lines = [f":siren-real: {len(penalties)} banned words in the last few seconds!"]
+    for user_id, word, new in penalties:
+        lines.append(f"• <@{user_id}> said '{word}'. Score: {new}.")
+    return "\n".join(lines)
+
+
+# Replies go out from background threads, paced per channel and backing off on 429s.
+# With OUTBOUND_COLLAPSE_MS > 0, penalties that pile up in a channel within that window become one summary reply.
+outbound = OutboundDispatcher(
+    app.client,
+    interval=int(os.environ.get("OUTBOUND_CHANNEL_INTERVAL_MS", "1000")) / 1000,
+    collapse_window=int(os.environ.get("OUTBOUND_COLLAPSE_MS", "0")) / 1000,
+    summarise=penalty_summary,
+)
+atexit.register(outbound.close)
+
+
+def send_penalty(message, result):
+    word, new = result
+    outbound.send(message.get("channel"), penalty_text(word, new), thread_ts=message.get("ts"),
+                  summary=(message.get("user"), word, new))
+
+
+# How far back `/ban-word <word> --sweep` looks, and whether the people it finds lose points for each old message
+SWEEP_FLAG = "--sweep"
+SWEEP_DAYS = float(os.environ.get("SWEEP_DAYS", "30"))
+SWEEP_PENALISE = os.environ.get("SWEEP_PENALISE", "0") == "1"
+# Most people listed by name in a sweep summary
+SWEEP_SUMMARY_USERS = 20
+
+
+def sweep_summary(record, scores):
+    """
+    The one message a finished sweep posts. scores holds new scores when the sweep took points off.
+    """
+    words = ", ".join(f"'{word}'" for word in record["words"])
+    days = round((record["started_at"] - float(record["oldest"])) / 86400)
+    hits = sorted(record["hits"].items(), key=lambda hit: (-hit[1], hit[0]))
+    head = f":mag: Looked back through {record['scanned']} messages from the last {days} days for {words}"
+    if not hits:
+        return f"{head}: nobody used it."
+    lines = [f"{head}: used in {sum(count for _, count in hits)} messages by {len(hits)} people."]
+    for user_id, count in hits[:SWEEP_SUMMARY_USERS]:
+        line = f"• <@{user_id}>: {count} {'message' if count == 1 else 'messages'}"
+        if user_id in scores:
+            line += f". Score: {scores[user_id]}"
+        lines.append(line + ".")
+    if len(hits) > SWEEP_SUMMARY_USERS:
+        lines.append(f"…and {len(hits) - SWEEP_SUMMARY_USERS} more.")
+    return "\n".join(lines)
+
+
+def sweep_finished(record):
+    caches_ready.wait()
+    scores = {}
+    if record["penalise"]:
+        for user_id, count in record["hits"].items():
+            scores[user_id] = score_store.add(user_id, -count)
+    logger.info(f"History sweep of {record['channel']} for {record['words']} found {len(record['hits'])} people "
+                f"in {record['scanned']} messages")
+    outbound.send(record["channel"], sweep_summary(record, scores))
+
+
+# Retroactive sweeps for `/ban-word <word> --sweep`. conversations.history is tier 3; sweeps left unfinished by a
+# restart carry on from their last checkpoint.
+history_sweeper = HistorySweeper(app.client, slack_bucket(3), storage.save_sweep, storage.delete_sweep,
+                                 sweep_finished)
+atexit.register(history_sweeper.close)
+try:
+    history_sweeper.resume(storage.load_sweeps())
+except Exception as e:
+    logger.error(f"Could not load unfinished history sweeps: {e}")
+
+
+def apply_shard_hit(message, word):
+    """
+    A shard found `word` in `message`: update the score here, where all shards' penalties meet, and reply.
+    """
+    send_penalty(message, (word, penalise(message.get("channel"), message.get("user"), word)))
+
+
+def start_shard_router(shards):
+    """
+    Moves banned-word matching into `shards` worker processes, each owning a slice of the channels.
+    """
+    global shard_router
+    from sharding import ShardRouter
+
+    caches_ready.wait()
+    with banned_lock:
+        shard_router = ShardRouter(shards, {chan: matcher.words for chan, matcher in banned_matchers.items()},
+                                   apply_shard_hit)
+    atexit.register(shard_router.close)
+    logger.info(f"Enforcing messages across {shards} shard processes")
+    return shard_router
 
 
 @app.event("app_mention")
+@metrics.timed("app_mention")
 def handle_mention_event(body, say, logger, client):
     user_id = body["event"]["user"]
     text = body["event"].get("text", "")
     channel_id = body["event"]["channel"]
-    logger.info(f"User {user_id} mentioned the bot in {channel_id}: {text}")
+    logger.info("User %s mentioned the bot in %s: %s", user_id, channel_id, text)
 
     text_without_mention = re.sub(r"<@[^>]+>", "", text).strip()
 
-    command = ai_request(f"""Identify if the following prompt is a command the bot can execute or a general message."
-                         Rules: 
-                         Respond with MESSAGE if it's a general message.
-                         Respond with SCORE if they are asking for their score.
-                         Respond with LEADERBOARD if they are asking for the leaderboard.
-                         Respond with BAN_WORD if they are asking to ban a word.
-                         Respond with UNBAN_WORD if they are asking to unban a word.
-                         Respond with BANNED_WORDS if they are asking for the list of banned words.
-                         Respond with REFLECT if they are asking to submit a reflection.
-                         Respond with HELP if they are asking for what you can do or what commands you can execute.
-                         Only respond with one of the above keywords and absolutely NOTHING else.
-                         Prompt: {text_without_mention}""")
-
-    context = client.conversations_history(
-        channel=channel_id,
-        inclusive=True,
-        limit=10
-    )
+    # Obvious commands are recognised locally; only ambiguous text costs an AI round-trip
+    command = classify_intent(text_without_mention)
+    if command is None:
+        command = ai_request(classification_prompt(text_without_mention), kind="classify").strip()
 
     match command:
         case "MESSAGE":
@@ -199,218 +607,183 @@ def handle_mention_event(body, say, logger, client):
         case "SCORE":
             score(ack=lambda: None, respond=lambda msg: say(msg), body={"user_id": user_id, "channel_id": channel_id})
             return
-        case "LEADERBOARD":
-            say("Please use the `/naughty-leaderboard` command to view the leaderboard.")
-            return
-        case "BAN_WORD":
-            say("To ban a word, please use the `/ban-word` command followed by the word you want to ban.")
-            return
-        case "UNBAN_WORD":
-            say("To unban a word, please use the `/unban-word` command followed by the word you want to unban.")
-            return
         case "BANNED_WORDS":
             list_banned_words(ack=lambda: None, respond=lambda **kwargs: say(**kwargs), body={"channel_id": channel_id})
             return
-        case "REFLECT":
-            say("To submit a reflection, please run the `/reflect` command")
+        case _ if command in COMMAND_REPLIES:
+            say(COMMAND_REPLIES[command])
             return
-        case "HELP":
-            say("Please check my commands at commands.md here: https://github.com/Spacexplorer11/Word_BAN/blob/main/Commands.md")
-            return
-
-    if user_id == "U08D22QNUVD":
-        say(ai_request(
-            f"User {user_id} said {text_without_mention}. Refer to them as <@{user_id}> in your final output. This is the creator of you (word ban) please talk to him respectfully and nicely. Please respond as if you are owned by him and serve him.",
-            context))
-        return
-    elif user_id == "U097SUCKJ90":
-        say(ai_request(
-            f"User {user_id} said {text_without_mention}. Refer to them as <@{user_id}> in your final output. This is the best friend of the creator of you (word ban) please talk to him with extreme sass and cheekiness. Please respond in a playful but not hurtful way. He has supported the creator throughout his life and is an amazing person. That said, sass is still welcomed but must be in a playful way. Use context to make the correct decision..",
-            context))
-        return
-    elif user_id == "U09192704Q7":
-        say(ai_request(
-            f"User {user_id} said {text_without_mention}. Refer to them as <@{user_id}> in your final output. This is a friend of the creator of you (word ban) please talk to him with a touch of sass.",
-            context))
-        return
 
-    say(ai_request(
-        f"User {user_id} said {text_without_mention}. Respond appropriately to the prompt. Refer to them as <@{user_id}> in your final output.",
-        context))
+    # Recent messages are only needed for a chat reply
+    context = client.conversations_history(
+        channel=channel_id,
+        inclusive=True,
+        limit=10
+    )
+    say(ai_request(persona_prompt(user_id, text_without_mention), context))
 
 
 @app.command("/ban-word")
+@metrics.timed("/ban-word")
 def ban_word(ack, command, respond, body):
     ack()
     logger.info(
         f"Received /ban-word from user {body['user_id']} in channel {body['channel_id']} with text '{command['text']}'")
 
-    with dbm.open("banned_words.db", "c") as db:
-        word_key = f"{body['channel_id']}:{command['text'].strip().lower()}"
-        if word_key == f"{body['channel_id']}:":
-            logger.warning(f"No word provided by {body['user_id']} in channel {body['channel_id']}")
-            respond("Please provide a word to ban.")
-            return
-        if len(command['text']) < 2:
-            logger.warning(f"Word provided by {body['user_id']} in channel {body['channel_id']} is too short")
-            respond("Please provide a longer word (3+ chars) to ban.")
-            return
-        if word_key in db:
-            logger.info(f"Word '{command['text'].strip()}' already banned in {body['channel_id']}")
-            respond(f"The word '{command['text'].strip()}' is already banned.")
-        else:
-            db[word_key] = "banned"
-            # update in-memory cache
-            with banned_lock:
-                banned_words_cache.setdefault(body["channel_id"], set()).add(command["text"].strip().lower())
-            logger.info(f"Banned word '{command['text'].strip()}' for channel {body['channel_id']}")
-            respond(f"The word '{command['text'].strip()}' has been banned.")
+    # "/ban-word <word> --sweep" also looks back through the channel's history for it
+    text = command['text'].strip()
+    sweep = text.endswith(SWEEP_FLAG)
+    if sweep:
+        text = text[:-len(SWEEP_FLAG)].strip()
+    # Normalised the same way as messages, so e.g. "hot dog" is stored as "hotdog" and can actually match
+    word = normalise(text)
+    # Checked after normalising: "a." would otherwise ban "a" and ":)" ban ":", which match almost every message
+    if not word.strip(":"):
+        logger.warning(f"No word provided by {body['user_id']} in channel {body['channel_id']}")
+        respond("Please provide a word to ban.")
+        return
+    if len(word.strip(":")) < MIN_WORD_LENGTH and not is_emoji(word):
+        logger.warning(f"Word provided by {body['user_id']} in channel {body['channel_id']} is too short")
+        respond(f"Please provide a longer word ({MIN_WORD_LENGTH}+ chars) to ban.")
+        return
+    created = storage.ban_word(body["channel_id"], word)
+    if not created:
+        logger.info(f"Word '{text}' already banned in {body['channel_id']}")
+        reply = f"The word '{text}' is already banned."
+    else:
+        # update in-memory cache
+        with banned_lock:
+            banned_words_cache.add(body["channel_id"], word)
+            rebuild_matcher(body["channel_id"])
+        logger.info(f"Banned word '{text}' for channel {body['channel_id']}")
+        reply = f"The word '{text}' has been banned."
+    if sweep:
+        # Messages since an earlier ban were already penalised live, so only a new ban takes points for old ones
+        penalise = SWEEP_PENALISE and created
+        history_sweeper.start(body["channel_id"], [word], body["user_id"], SWEEP_DAYS, penalise=penalise)
+        reply += f" Looking back through the last {SWEEP_DAYS:g} days for it; I'll post what I find here."
+        if SWEEP_PENALISE and not created:
+            reply += " Nobody loses points for it, as it was already banned."
+    respond(reply)
 
 
 @app.event("message")
+@metrics.timed("message")
 def handle_message_events(logger, message, say, client):
     """
     Handles incoming messages and checks for banned words and emojis.
     Optimized: uses in-memory caches for scores and reflections, and thread-safe update.
     """
-    channel_id = message.get("channel")
-    user_id = message.get("user")
-    raw_text = message.get("text", "")
-
-    # Flatten message: lowercase, strip all non-alphanumeric and non-colon characters (removes underscores, dashes, etc.), no whitespace removal
-    flattened = re.sub(r"[^a-zA-Z0-9:]", "", raw_text.lower())
-
-    penalised = False
-    with banned_lock:
-        banned_set = banned_words_cache.get(channel_id, set())
-        for word in banned_set:
-            if word in flattened:
-                with scores_lock:
-                    old = scores_cache.get(user_id, 0)
-                    new = old - 1
-                    scores_cache[user_id] = new
-                    try:
-                        with dbm.open("scores.db", "c") as scores_db:
-                            scores_db[user_id] = str(new)
-                    except Exception as e:
-                        logger.error(f"Failed to write score for {user_id}: {e}")
-                say(
-                    text=f":siren-real: The {'emoji' if word.startswith(':') and word.endswith(':') else 'word'} '{word}' is banned! Score: {new}.",
-                    thread_ts=message.get("ts")
-                )
-                logger.info(f"Penalised {user_id} for '{word}' in {channel_id}")
-                break
-    # Ensure user has a score entry in cache
-    with scores_lock:
-        if user_id not in scores_cache:
-            scores_cache[user_id] = 0
-            try:
-                with dbm.open("scores.db", "c") as scores_db:
-                    scores_db[user_id] = "0"
-            except Exception as e:
-                logger.error(f"Failed to initialize score for {user_id}: {e}")
+    if not is_scorable(message):
+        return
+    if shard_router is not None:
+        # Matched in a shard process; penalties come back through apply_shard_hit
+        shard_router.submit(message)
+        ensure_score(message.get("user"))
+        return
+    result = enforce_message(message.get("channel"), message.get("user"), message.get("text", ""))
+    if result is not None:
+        send_penalty(message, result)
     # Reflection processing is now handled in a background scheduler.
 
 
 @app.command("/unban-word")
+@metrics.timed("/unban-word")
 def unban_word(ack, command, respond, body):
     ack()
     logger.info(
         f"Received /unban-word from user {body['user_id']} in channel {body['channel_id']} with text '{command['text']}'")
 
-    with dbm.open("banned_words.db", "c") as db:
-        word_key = f"{body['channel_id']}:{command['text'].strip().lower()}"
-        if word_key == f"{body['channel_id']}:":
-            logger.warning(f"No word provided by {body['user_id']} in channel {body['channel_id']}")
-            respond("Please provide a word to unban.")
-            return
-        if word_key not in db:
-            logger.info(f"Attempt to unban non-existent word '{command['text'].strip()}' in {body['channel_id']}")
-            respond(f"The word '{command['text'].strip()}' is not banned.")
-            return
-        else:
-            db.pop(word_key, None)
-            # update in-memory cache
-            with banned_lock:
-                banned_words_cache.get(body["channel_id"], set()).discard(command["text"].strip().lower())
-            logger.info(f"Unbanned word '{command['text'].strip()}' for channel {body['channel_id']}")
-            respond(f"The word '{command['text'].strip()}' was unbanned.")
+    word = normalise(command['text'])
+    if not word:
+        logger.warning(f"No word provided by {body['user_id']} in channel {body['channel_id']}")
+        respond("Please provide a word to unban.")
+        return
+    # Bans made before words were normalised are stored raw ("hot dog"), so every stored form of the word goes
+    stored = {w for w in banned_words_cache.get(body["channel_id"], ()) if normalise(w) == word} | {word}
+    removed = [w for w in stored if storage.unban_word(body["channel_id"], w)]
+    if not removed:
+        logger.info(f"Attempt to unban non-existent word '{command['text'].strip()}' in {body['channel_id']}")
+        respond(f"The word '{command['text'].strip()}' is not banned.")
+        return
+    else:
+        # update in-memory cache
+        with banned_lock:
+            for w in removed:
+                banned_words_cache.discard(body["channel_id"], w)
+            rebuild_matcher(body["channel_id"])
+        logger.info(f"Unbanned word '{command['text'].strip()}' for channel {body['channel_id']}")
+        respond(f"The word '{command['text'].strip()}' was unbanned.")
 
 
 @app.command("/banned-words")
+@metrics.timed("/banned-words")
 def list_banned_words(ack, respond, body):
     ack()
     channel_id = body.get("channel_id")
-    channel_banned_words = []
-    try:
-        with dbm.open("banned_words.db", "r") as db:
-            banned_words = tuple(db.keys())
-            for word in banned_words:
-                prefix = f"{channel_id}:".encode('utf-8')
-                if word.startswith(prefix):
-                    banned_word = word[len(prefix):].decode('utf-8')
-                    channel_banned_words.append(banned_word)
-        logger.info(f"Listed banned words for channel {channel_id}: {channel_banned_words}")
-        if channel_banned_words:
-            blocks = [
-                {
-                    "type": "rich_text",
-                    "elements": [
-                        {
-                            "type": "rich_text_section",
-                            "elements": [
-                                {
-                                    "type": "text",
-                                    "text": "Banned words in this channel:"
-                                }
-                            ]
-                        },
-                        {
-                            "type": "rich_text_list",
-                            "style": "bullet",
-                            "elements": [
-                                {
-                                    "type": "rich_text_section",
-                                    "elements": [
-                                        {
-                                            "type": "text",
-                                            "text": word
-                                        }
-                                    ]
-                                } for word in channel_banned_words
-                            ]
-                        }
-                    ]
-                }
-            ]
-            respond(blocks=blocks, text="Banned words in this channel")
-        else:
-            respond("There are no banned words in this channel.")
-    except FileNotFoundError as e:
-        logger.warning(f"Banned words DB missing when listing banned words: {e}")
-        respond("No banned words found.")
+    # The matcher's word set is an immutable snapshot of the channel's bans, so no lock or storage read is needed
+    channel_banned_words = sorted(banned_matchers.get(channel_id, EMPTY_MATCHER).words)
+    # The full list can be long, so it is only formatted when debug logging is on
+    logger.info("Listed %d banned words for channel %s", len(channel_banned_words), channel_id)
+    logger.debug("Banned words for channel %s: %s", channel_id, channel_banned_words)
+    if channel_banned_words:
+        blocks = [
+            {
+                "type": "rich_text",
+                "elements": [
+                    {
+                        "type": "rich_text_section",
+                        "elements": [
+                            {
+                                "type": "text",
+                                "text": "Banned words in this channel:"
+                            }
+                        ]
+                    },
+                    {
+                        "type": "rich_text_list",
+                        "style": "bullet",
+                        "elements": [
+                            {
+                                "type": "rich_text_section",
+                                "elements": [
+                                    {
+                                        "type": "text",
+                                        "text": word
+                                    }
+                                ]
+                            } for word in channel_banned_words
+                        ]
+                    }
+                ]
+            }
+        ]
+        respond(blocks=blocks, text="Banned words in this channel")
+    else:
+        respond("There are no banned words in this channel.")
 
 
 @app.command("/is-banned")
+@metrics.timed("/is-banned")
 def is_banned(ack, command, respond, body):
     ack()
     channel_id = body.get("channel_id")
-    word = f"{channel_id}:{command.get('text', '').strip().lower()}"
+    word = normalise(command.get('text', ''))
     logger.info(f"Received /is-banned from user {body['user_id']} in channel {channel_id} with word '{word}'")
-    if word == f"{channel_id}:":
+    if not word:
         logger.warning(f"No word provided by {body['user_id']} in channel {channel_id}")
         respond("Please provide a word to check.")
         return
-    with dbm.open("banned_words.db", "r") as db:
-        if word in db:
-            logger.info(f"The word '{command['text'].strip()}' is banned in channel {channel_id}")
-            respond(f"The word '{command['text'].strip()}' is banned in this channel.")
-        else:
-            logger.info(f"The word '{command['text'].strip()}' is not banned in channel {channel_id}")
-            respond(f"The word '{command['text'].strip()}' is not banned in this channel.")
+    if word in banned_matchers.get(channel_id, EMPTY_MATCHER).words:
+        logger.info(f"The word '{command['text'].strip()}' is banned in channel {channel_id}")
+        respond(f"The word '{command['text'].strip()}' is banned in this channel.")
+    else:
+        logger.info(f"The word '{command['text'].strip()}' is not banned in channel {channel_id}")
+        respond(f"The word '{command['text'].strip()}' is not banned in this channel.")
 
 
 @app.command("/score")
+@metrics.timed("/score")
 def score(ack, respond, body):
     """
     Displays the user's score based on banned words.
@@ -419,29 +792,31 @@ def score(ack, respond, body):
     user_id = body['user_id']
     logger.info(f"Received /score from user {user_id} in channel {body['channel_id']}")
 
-    # Use in-memory cache for scores
-    with scores_lock:
-        score = scores_cache.get(user_id, 0)
+    # Lock-free read of the in-memory score
+    score = score_store.get(user_id)
+    rank = score_index.rank(user_id, score)
     logger.info(f"User {user_id} has a score of {score}")
-    respond(f"Your current score is: {score}")
+    if rank is not None:
+        respond(f"Your current score is: {score} (#{rank} on the naughty leaderboard)")
+    else:
+        respond(f"Your current score is: {score}")
 
 
 @app.command("/naughty-leaderboard")
+@metrics.timed("/naughty-leaderboard")
 def leaderboard(ack, respond, body):
     ack()
     logger.info(f"Received /leaderboard from user {body['user_id']} in channel {body['channel_id']}")
-    # Use in-memory cache for scores
-    with scores_lock:
-        scores = {user_id: score for user_id, score in scores_cache.items() if score != 0}
-    if not scores:
+    # The index keeps users in order and caches the rendered top 10 until it changes
+    if not len(score_index):
         respond("There are no users with non-zero scores to display.")
         return
-    logger.info(f"Scores loaded for leaderboard: {scores}")
-    blocks = generate_leaderboard_blocks(scores)
-    respond(blocks=blocks, text="Leaderboard")
+    logger.info(f"Leaderboard has {len(score_index)} users with non-zero scores")
+    respond(blocks=score_index.blocks(), text="Leaderboard")
 
 
 @app.command("/reflect")
+@metrics.timed("/reflect")
 def reflection(ack, respond, body):
     ack()
     global reflection_channel_id
@@ -449,11 +824,10 @@ def reflection(ack, respond, body):
     logger.info(f"Received /reflect command from user {body['user_id']} in channel {body['channel_id']}")
     # Use in-memory cache for pending reflections
     with reflections_lock:
-        for reflection in reflections_cache:
-            if not reflection.get("processed", False) and reflection.get("user") == body["user_id"]:
-                respond(
-                    "You already have a pending reflection. Please wait for it to be processed before submitting another.")
-                return
+        if body["user_id"] in reflections_cache:
+            respond(
+                "You already have a pending reflection. Please wait for it to be processed before submitting another.")
+            return
 
     app.client.views_open(
         trigger_id=body["trigger_id"],
@@ -491,6 +865,7 @@ def reflection(ack, respond, body):
 
 
 @app.view("reflect_modal")
+@metrics.timed("reflect_modal")
 def handle_reflect_submission(ack, body, view, client, logger):
     ack()
     user = body["user"]["id"]
@@ -551,6 +926,7 @@ def handle_reflect_submission(ack, body, view, client, logger):
 
 # Handler for confirmation button
 @app.action("reflect_confirm")
+@metrics.timed("reflect_confirm")
 def confirm_reflection(ack, body, client, logger, say):
     ack()
     user = body["user"]["id"]
@@ -558,13 +934,11 @@ def confirm_reflection(ack, body, client, logger, say):
 
     # Check in-memory cache for user pending reflection
     with reflections_lock:
-        for reflection in reflections_cache:
-            if not reflection.get("processed", False) and reflection.get("user") == user:
-                say("You already have a pending reflection. Please wait for it to be processed before submitting another.")
-                return
+        if user in reflections_cache:
+            say("You already have a pending reflection. Please wait for it to be processed before submitting another.")
+            return
 
     timestamp = int(time.time())
-    key = f"{user}:{timestamp}"
     try:
         response = client.chat_postMessage(
             channel=reflection_channel_id,
@@ -582,15 +956,17 @@ def confirm_reflection(ack, body, client, logger, say):
         "channel": reflection_channel_id,
         "ts": ts,
         "processed": False,
+        "votes": {name: [] for name in VOTE_REACTIONS},
     }
     # Save to DB and in-memory cache (thread-safe)
     try:
-        with dbm.open("reflections.db", "c") as db:
-            db[key] = json.dumps(record)
+        storage.save_reflection(record)
     except Exception as e:
         logger.error(f"Failed to store reflection in DB: {e}")
     with reflections_lock:
-        reflections_cache.append(record)
+        reflections_cache[user] = record
+        track_votes(record)
+    reflection_scheduler.add(record)
     try:
         client.reactions_add(channel=reflection_channel_id, timestamp=ts, name="upvote")
         client.reactions_add(channel=reflection_channel_id, timestamp=ts, name="downvote")
@@ -603,6 +979,7 @@ def confirm_reflection(ack, body, client, logger, say):
 
 
 @app.action("reflect_cancel")
+@metrics.timed("reflect_cancel")
 def cancel_reflection(ack, body, client, logger):
     ack()
     user = body["user"]["id"]
@@ -626,115 +1003,241 @@ def cancel_reflection(ack, body, client, logger):
         logger.error(f"Failed to send ephemeral reflection cancel message: {e}")
 
 
+def record_vote(event, added):
+    """
+    Applies one reaction event to the tally of the reflection it was made on, if any. The author's own votes don't count.
+    """
+    name = event.get("reaction")
+    if name not in VOTE_REACTIONS:
+        return
+    item = event.get("item") or {}
+    with reflections_lock:
+        record = reflections_by_message.get((item.get("channel"), item.get("ts")))
+        if record is None or event.get("user") == record["user"]:
+            return
+        voters = vote_tallies[reflection_key(record)][name]
+        before = len(voters)
+        if added:
+            voters.add(event["user"])
+        else:
+            voters.discard(event["user"])
+        # Redelivered or out-of-order events leave the set unchanged, so there is nothing to save
+        if len(voters) != before:
+            save_votes(record)
+
+
+@app.event("reaction_added")
+@metrics.timed("reaction_added")
+def handle_reaction_added(event):
+    record_vote(event, added=True)
+
+
+@app.event("reaction_removed")
+@metrics.timed("reaction_removed")
+def handle_reaction_removed(event):
+    record_vote(event, added=False)
+
+
 @app.command("/reset-words")
+@metrics.timed("/reset-words")
 def reset_words(ack, command, respond, body):
     ack()
     if body['user_id'] == "U08D22QNUVD":
         channel_id = body.get("channel_id")
-        channel_banned_words = []
-        with dbm.open("banned_words.db", "c") as db:
-            for word in db:
-                prefix = f"{channel_id}:".encode('utf-8')
-                if word.startswith(prefix):
-                    banned_word = word[len(prefix):].decode('utf-8')
-                    channel_banned_words.append(banned_word)
-            for word in channel_banned_words:
-                word_key = f"{channel_id}:{word}"
-                db.pop(word_key, None)
         with banned_lock:
-            banned_words_cache[channel_id] = set()
+            words = banned_words_cache.pop(channel_id)
+            rebuild_matcher(channel_id)
+        storage.reset_channel(channel_id, words)
         logger.info(f"Reset banned words for channel {channel_id}")
         respond("All banned words have been reset for this channel.")
     else:
         respond("Only the master & supreme leader - <@U08D22QNUVD> - can use this command. Not you peasant.")
 
 
-if __name__ == "__main__":
-    import threading
+# How many due reflections are tallied at once
+REFLECTION_WORKERS = int(os.environ.get("REFLECTION_WORKERS", "4"))
 
 
-    def process_pending_reflections():
-        """
-        Periodically checks for pending reflections and processes them.
-        """
+def process_pending_reflections(client=None):
+    """
+    Processes pending reflections as soon as their vote closes, several at a time.
+    """
+    if client is None:
         try:
             from slack_sdk import WebClient
+            from slack_sdk.http_retry.builtin_handlers import RateLimitErrorRetryHandler
             slack_token = os.environ.get("SLACK_BOT_TOKEN")
             if not slack_token:
                 logger.error("SLACK_BOT_TOKEN not set in environment")
                 return
             client = WebClient(token=slack_token)
+            # Sleep through Retry-After on a 429 instead of failing the reflection
+            client.retry_handlers.append(RateLimitErrorRetryHandler(max_retry_count=3))
         except Exception as e:
             logger.error(f"Could not create Slack WebClient: {e}")
             return
 
+    caches_ready.wait()
+    # reactions.get and conversations.open are tier 3; chat.postMessage allows about one a second
+    reactions_bucket = slack_bucket(3)
+    open_bucket = slack_bucket(3)
+    post_bucket = slack_bucket(4)
+
+    @lru_cache(maxsize=1024)
+    def dm_channel(user_id):
+        open_bucket.acquire()
+        response = client.conversations_open(users=user_id)
+        return response["channel"]["id"]
+
+    def reconcile(reflection):
+        """
+        Re-counts a reflection's votes from Slack, for reflections that were open while we weren't listening.
+        """
+        reactions_bucket.acquire()
+        # full=True, or reactions with many voters come back truncated
+        response = client.reactions_get(channel=reflection['channel'], timestamp=reflection["ts"], full=True)
+        tally = {name: set() for name in VOTE_REACTIONS}
+        for reaction in response["message"].get("reactions", []):
+            if reaction["name"] in tally:
+                # Only count votes from users other than the reflection's author
+                tally[reaction["name"]].update(u for u in reaction["users"] if u != reflection["user"])
+        with reflections_lock:
+            key = reflection_key(reflection)
+            vote_tallies[key] = tally
+            stale_tallies.discard(key)
+            save_votes(reflection)
+
+    def log_reconcile_failure(future):
+        # Not fatal: settle() tries again when the vote closes
+        if future.exception() is not None:
+            logger.warning(f"Could not re-count reflection votes: {future.exception()}")
+
+    def settle(reflection):
+        key = reflection_key(reflection)
+        with reflections_lock:
+            stale = key in stale_tallies
+        if stale:
+            reconcile(reflection)
+        # Votes have been counted as reactions came in, so settling is a lookup
+        with reflections_lock:
+            tally = vote_tallies.get(key) or {name: () for name in VOTE_REACTIONS}
+            upvotes = len(tally["upvote"])
+            downvotes = len(tally["downvote"])
+        dm_channel_id = dm_channel(reflection['user'])
+        post_bucket.acquire()
+        if upvotes > downvotes:
+            logger.info(
+                f"Majority agreed and upvoted the reflection by {reflection['user']} which was {reflection['reflection']}")
+            client.chat_postMessage(
+                channel=dm_channel_id,
+                text=f":whitecheckmark: Your reflection '{reflection['reflection']}' received more upvotes than downvotes! \n This means your score was reset to 0!"
+            )
+            set_score(reflection['user'], 0)
+        elif downvotes > upvotes:
+            logger.info(
+                f"Majority disagreed and downvoted the reflection by {reflection['user']} which was {reflection['reflection']}")
+            client.chat_postMessage(
+                channel=dm_channel_id,
+                text=f":x: Your reflection '{reflection['reflection']}' received more downvotes than upvotes! \n This means your score was not reset to 0 and instead remains the same. You may try again."
+            )
+        else:
+            logger.info(
+                f"The was a tie for the reflection by {reflection['user']} which was {reflection['reflection']}")
+            client.chat_postMessage(
+                channel=dm_channel_id,
+                text=f"Your reflection '{reflection['reflection']}' received the same amount of upvotes and downvotes! \n This means your score stays the same. You may try again."
+            )
+        return reflection
+
+    with ThreadPoolExecutor(max_workers=REFLECTION_WORKERS, thread_name_prefix="reflection") as pool:
+        # Bring tallies that span a restart up to date now, rather than all at once when their votes close
+        with reflections_lock:
+            stale = [record for record in reflections_by_message.values() if reflection_key(record) in stale_tallies]
+        for reflection in stale:
+            pool.submit(reconcile, reflection).add_done_callback(log_reconcile_failure)
         while True:
-            now = time.time()
-            to_process = []
-            with reflections_lock:
-                for reflection in reflections_cache:
-                    if not reflection.get("processed", False) and now > reflection["created_at"] + 86400:
-                        to_process.append(reflection)
-            for reflection in to_process:
+            to_process = reflection_scheduler.wait_due()
+            if not to_process:
+                return
+            futures = [(reflection, pool.submit(settle, reflection)) for reflection in to_process]
+            processed = []
+            for reflection, future in futures:
                 try:
-                    reflection_id = reflection["ts"]
-                    response = client.reactions_get(channel=reflection['channel'], timestamp=reflection_id)
-                    reactions = response["message"].get("reactions", [])
-                    upvotes = 0
-                    downvotes = 0
-                    for reaction in reactions:
-                        # Only count votes from users other than the reflection's author
-                        if reaction["name"] == "upvote":
-                            upvotes = len([u for u in reaction["users"] if u != reflection["user"]])
-                        elif reaction["name"] == "downvote":
-                            downvotes = len([u for u in reaction["users"] if u != reflection["user"]])
-                    response = client.conversations_open(users=reflection['user'])
-                    dm_channel_id = response["channel"]["id"]
-                    if upvotes > downvotes:
-                        logger.info(
-                            f"Majority agreed and upvoted the reflection by {reflection['user']} which was {reflection['reflection']}")
-                        client.chat_postMessage(
-                            channel=dm_channel_id,
-                            text=f":whitecheckmark: Your reflection '{reflection['reflection']}' received more upvotes than downvotes! \n This means your score was reset to 0!"
-                        )
-                        with scores_lock:
-                            scores_cache[reflection['user']] = 0
-                            try:
-                                with dbm.open("scores.db", "c") as scores_db:
-                                    scores_db[reflection['user']] = "0"
-                            except Exception as e:
-                                logger.error(f"Failed to reset score for {reflection['user']}: {e}")
-                    elif downvotes > upvotes:
-                        logger.info(
-                            f"Majority disagreed and downvoted the reflection by {reflection['user']} which was {reflection['reflection']}")
-                        client.chat_postMessage(
-                            channel=dm_channel_id,
-                            text=f":x: Your reflection '{reflection['reflection']}' received more downvotes than upvotes! \n This means your score was not reset to 0 and instead remains the same. You may try again."
-                        )
-                    else:
-                        logger.info(
-                            f"The was a tie for the reflection by {reflection['user']} which was {reflection['reflection']}")
-                        client.chat_postMessage(
-                            channel=dm_channel_id,
-                            text=f"Your reflection '{reflection['reflection']}' received the same amount of upvotes and downvotes! \n This means your score stays the same. You may try again."
-                        )
-                    mark_reflection_processed(f"{reflection['user']}:{reflection['created_at']}")
-                    with reflections_lock:
-                        reflection["processed"] = True
-                    try:
-                        with dbm.open("reflections.db", "c") as db:
-                            key = f"{reflection['user']}:{reflection['created_at']}"
-                            if key.encode() in db:
-                                db[key] = json.dumps(reflection)
-                    except Exception as e:
-                        logger.error(f"Failed to mark reflection processed in DB: {e}")
+                    processed.append(future.result())
                 except Exception as e:
                     logger.error(f"Error processing reflection {reflection}: {e}")
-            time.sleep(180)
+                    reflection_scheduler.retry(reflection, 180)
+            if not processed:
+                continue
+            # Processed reflections only live in storage from now on
+            with reflections_lock:
+                for reflection in processed:
+                    reflection["processed"] = True
+                    if reflections_cache.get(reflection["user"]) is reflection:
+                        del reflections_cache[reflection["user"]]
+                    untrack_votes(reflection)
+            try:
+                storage.mark_reflections_processed([reflection_key(reflection) for reflection in processed])
+            except Exception as e:
+                logger.error(f"Failed to mark {len(processed)} reflections processed in DB: {e}")
 
 
+def start_reflection_worker():
     reflection_thread = threading.Thread(target=process_pending_reflections, daemon=True)
     reflection_thread.start()
+    return reflection_thread
+
+
+# --- Metrics (read when /metrics is scraped) ---
+metrics.gauge("wordban_reflections_pending", "Reflections waiting for their vote to close", [],
+              lambda: [((), len(reflection_scheduler))])
+metrics.gauge("wordban_score_journal_pending", "Score changes not yet written to storage", [],
+              lambda: [((), score_journal.pending())])
+metrics.gauge("wordban_dedup_events_total", "Slack events checked for redelivery and how many were dropped",
+              ["outcome"], lambda: [(("checked",), dedup.checked), (("dropped",), dedup.dropped)], kind="counter")
+metrics.gauge("wordban_dedup_size", "Event fingerprints currently remembered", [], lambda: [((), len(dedup))])
+metrics.gauge("wordban_shard_pending", "Messages waiting to be sent to a shard process", [],
+              lambda: [((), shard_router.pending() if shard_router is not None else 0)])
+metrics.gauge("wordban_sweeps_pending", "History sweeps waiting to run", [],
+              lambda: [((), history_sweeper.pending())])
+metrics.gauge("wordban_outbound_pending", "Replies queued for sending", [], lambda: [((), outbound.pending())])
+metrics.gauge("wordban_outbound_total", "Outbound replies by outcome", ["outcome"],
+              lambda: list(outbound.counts.items()), kind="counter")
+metrics.gauge("wordban_ai_provider_latency_seconds", "Recent AI provider latency", ["provider", "quantile"],
+              lambda: [((name, q), stats[f"p{int(q * 100)}"])
+                       for name, stats in ai_gateway.snapshot().items() for q in (0.5, 0.95)])
+metrics.gauge("wordban_ai_provider_requests_total", "AI provider calls by outcome", ["provider", "outcome"],
+              lambda: [((name, outcome), stats[outcome]) for name, stats in ai_gateway.snapshot().items()
+                       for outcome in ("selected", "calls", "errors", "timeouts", "hedges", "wins")], kind="counter")
+metrics.gauge("wordban_ai_provider_open", "1 while a provider's circuit breaker is open", ["provider"],
+              lambda: [((name,), int(stats["breaker"] == "open")) for name, stats in ai_gateway.snapshot().items()])
+metrics.gauge("wordban_ai_cache", "AI response cache counters", ["cache", "stat"],
+              lambda: [((kind, stat), value) for kind, cache in ai_caches.items() for stat, value in cache.stats().items()])
+
+
+if __name__ == "__main__":
+    import signal
+    import sys
+
+    # systemd stops us with SIGTERM; exit normally so atexit flushes the score journal
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    if metrics.enabled:
+        metrics.serve()
+
+    # ENFORCE_SHARDS > 1 spreads message matching over that many processes (one per spare core is a good start)
+    enforce_shards = int(os.environ.get("ENFORCE_SHARDS", "0"))
+    if enforce_shards > 1:
+        start_shard_router(enforce_shards)
+
+    if os.environ.get("BOT_MODE", "sync").lower() == "async":
+        # Let async_app share this module's caches instead of importing app.py a second time
+        sys.modules["app"] = sys.modules[__name__]
+        import async_app
+
+        async_app.main()
+    else:
+        start_reflection_worker()
 
-    logger.info("Starting Slack bot listener")
-    SocketModeHandler(app, os.environ["SLACK_APP_TOKEN"]).start()
+        logger.info("Starting Slack bot listener")
+        SocketModeHandler(app, os.environ["SLACK_APP_TOKEN"]).start()
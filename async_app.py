@@ -0,0 +1,171 @@
+import asyncio
+import inspect
+import os
+import re
+
+from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
+from slack_bolt import BoltResponse
+from slack_bolt.async_app import AsyncApp
+
+import app as bot
+import metrics
+from dedup import event_key
+from intents import classify_intent
+
+# asyncio flavour of the bot (BOT_MODE=async). Messages and mentions are handled natively on the event loop,
+# so slow AI calls never hold up enforcement. Everything else reuses app.py's listeners on worker threads.
+async_app = AsyncApp(
+    token=os.environ.get("SLACK_BOT_TOKEN"),
+)
+
+
+@async_app.middleware
+async def drop_redeliveries(body, next):
+    # Shares app.py's dedup cache
+    key = event_key(body)
+    if key is not None and bot.dedup.seen(key):
+        bot.logger.info("Dropped redelivered event %s", key)
+        return BoltResponse(status=200, body="")
+    await next()
+
+
+@async_app.middleware
+async def wait_for_caches(next):
+    # app.py fills its caches on a background thread; hold the first events until it's done
+    if not bot.caches_ready.is_set():
+        await asyncio.to_thread(bot.caches_ready.wait)
+    await next()
+
+
+def _blocking(async_fn, loop):
+    """
+    Wraps an async Bolt utility (ack, respond, say) so a worker thread can call it like the sync one.
+    """
+    def call(*args, **kwargs):
+        return asyncio.run_coroutine_threadsafe(async_fn(*args, **kwargs), loop).result()
+
+    return call
+
+
+def bridge(handler):
+    """
+    Turns one of app.py's sync listeners into an async one that runs it on a worker thread.
+    """
+    params = list(inspect.signature(handler).parameters)
+
+    async def listener(args):
+        loop = asyncio.get_running_loop()
+        kwargs = {}
+        for name in params:
+            if name == "client":
+                # The sync listeners expect a sync WebClient
+                kwargs[name] = bot.app.client
+            elif name == "logger":
+                kwargs[name] = bot.logger
+            elif name in ("ack", "respond", "say"):
+                kwargs[name] = _blocking(getattr(args, name), loop)
+            else:
+                kwargs[name] = getattr(args, name)
+        await asyncio.to_thread(handler, **kwargs)
+
+    return listener
+
+
+def _collect():
+    """
+    A respond() stand-in that records replies so they can be sent with an async say().
+    """
+    replies = []
+
+    def respond(text=None, **kwargs):
+        if text is not None:
+            kwargs["text"] = text
+        replies.append(kwargs)
+
+    return respond, replies
+
+
+@async_app.event("message")
+@metrics.timed("message")
+async def handle_message_events(message):
+    if not bot.is_scorable(message):
+        return
+    if bot.shard_router is not None:
+        bot.shard_router.submit(message)
+        bot.ensure_score(message.get("user"))
+        return
+    result = bot.enforce_message(message.get("channel"), message.get("user"), message.get("text", ""))
+    if result is not None:
+        bot.send_penalty(message, result)
+
+
+@async_app.event("app_mention")
+@metrics.timed("app_mention")
+async def handle_mention_event(body, say, logger, client):
+    user_id = body["event"]["user"]
+    text = body["event"].get("text", "")
+    channel_id = body["event"]["channel"]
+    logger.info("User %s mentioned the bot in %s: %s", user_id, channel_id, text)
+
+    text_without_mention = re.sub(r"<@[^>]+>", "", text).strip()
+
+    # Obvious commands are recognised locally; only ambiguous text costs an AI round-trip
+    command = classify_intent(text_without_mention)
+    if command is None:
+        command = (await bot.ai_request_async(bot.classification_prompt(text_without_mention), kind="classify")).strip()
+
+    respond, replies = _collect()
+    match command:
+        case "MESSAGE":
+            pass
+        case "SCORE":
+            bot.score(ack=lambda: None, respond=respond, body={"user_id": user_id, "channel_id": channel_id})
+        case "BANNED_WORDS":
+            bot.list_banned_words(ack=lambda: None, respond=respond, body={"channel_id": channel_id})
+        case _ if command in bot.COMMAND_REPLIES:
+            replies.append({"text": bot.COMMAND_REPLIES[command]})
+    if replies:
+        for reply in replies:
+            await say(**reply)
+        return
+
+    # Recent messages are only needed for a chat reply
+    context = await client.conversations_history(
+        channel=channel_id,
+        inclusive=True,
+        limit=10
+    )
+    await say(await bot.ai_request_async(bot.persona_prompt(user_id, text_without_mention), context))
+
+
+# Commands and reflection actions touch storage or the sync Slack client, so they run on threads
+async_app.command("/ban-word")(bridge(bot.ban_word))
+async_app.command("/unban-word")(bridge(bot.unban_word))
+async_app.command("/banned-words")(bridge(bot.list_banned_words))
+async_app.command("/is-banned")(bridge(bot.is_banned))
+async_app.command("/score")(bridge(bot.score))
+async_app.command("/naughty-leaderboard")(bridge(bot.leaderboard))
+async_app.command("/reflect")(bridge(bot.reflection))
+async_app.view("reflect_modal")(bridge(bot.handle_reflect_submission))
+async_app.action("reflect_confirm")(bridge(bot.confirm_reflection))
+async_app.action("reflect_cancel")(bridge(bot.cancel_reflection))
+async_app.command("/reset-words")(bridge(bot.reset_words))
+async_app.event("reaction_added")(bridge(bot.handle_reaction_added))
+async_app.event("reaction_removed")(bridge(bot.handle_reaction_removed))
+
+
+def main():
+    import signal
+    import sys
+
+    # systemd stops us with SIGTERM; exit normally so atexit flushes the score journal
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    bot.start_reflection_worker()
+
+    bot.logger.info("Starting Slack bot listener (asyncio)")
+    asyncio.run(AsyncSocketModeHandler(async_app, os.environ["SLACK_APP_TOKEN"]).start_async())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Memory for the score and banned-word caches on a large workspace: plain dicts and sets with a matcher per channel
+(before) against ScoreStore / CompactScoreStore, BannedWordSets and shared matchers that skip the automaton for
+short word lists.
+
+    python benchmarks/bench_memory.py [--users 100000] [--channels 10000]
+"""
+import argparse
+import gc
+import os
+import random
+import string
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compact import BannedWordSets  # noqa: E402
+import matcher  # noqa: E402
+from matcher import BannedWordMatcher, shared_matcher  # noqa: E402
+from score_store import CompactScoreStore, ScoreStore  # noqa: E402
+
+
+def slack_id(rng, prefix):
+    return prefix + "".join(rng.choice(string.ascii_uppercase + string.digits) for _ in range(10))
+
+
+def workspace(users, channels, seed=0):
+    """
+    Rows as storage hands them back: every ID and word is its own str object, as if just read from the database.
+    Most users are on 0; a fifth of channels use one of a few popular ban lists, the rest pick from a shared vocabulary.
+    """
+    rng = random.Random(seed)
+    scores = {slack_id(rng, "U"): (0 if rng.random() < 0.8 else -rng.randint(1, 60)) for _ in range(users)}
+    vocabulary = ["".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 9))) for _ in range(3000)]
+    popular = [rng.sample(vocabulary[:200], rng.randint(3, 12)) for _ in range(20)]
+    banned = {}
+    for _ in range(channels):
+        if rng.random() < 0.2:
+            words = rng.choice(popular)
+        else:
+            # Skewed towards the start of the vocabulary, like real bans ("dog" everywhere)
+            words = [vocabulary[min(int(rng.expovariate(1 / 150)), len(vocabulary) - 1)] for _ in range(rng.randint(1, 10))]
+        banned[slack_id(rng, "C")] = {"".join(word) for word in words}
+    return scores, banned
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del kept
+    return used
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--channels", type=int, default=10000)
+    args = parser.parse_args()
+
+    scores, banned = workspace(args.users, args.channels)
+
+    def fresh_scores():
+        # New str keys each time, as storage.load_scores() would return
+        return {"".join(user): score for user, score in scores.items()}
+
+    def fresh_banned():
+        return {"".join(chan): {"".join(word) for word in words} for chan, words in banned.items()}
+
+    def scores_dict():
+        return fresh_scores()
+
+    def scores_store(cls):
+        def build():
+            store = cls()
+            store.load(fresh_scores())
+            return store
+        return build
+
+    def banned_before():
+        # Before, every channel got a full automaton however few words it had
+        limit, matcher.FIND_LIMIT = matcher.FIND_LIMIT, 0
+        try:
+            words = fresh_banned()
+            return words, {chan: BannedWordMatcher(w) for chan, w in words.items()}
+        finally:
+            matcher.FIND_LIMIT = limit
+
+    def banned_after():
+        words = BannedWordSets()
+        words.update(fresh_banned())
+        return words, {chan: shared_matcher(w) for chan, w in words.items()}
+
+    rows = [
+        (f"scores, {args.users:,} users", [
+            ("dict (before)", measure(scores_dict)),
+            ("ScoreStore", measure(scores_store(ScoreStore))),
+            ("CompactScoreStore", measure(scores_store(CompactScoreStore))),
+        ]),
+        (f"banned words + matchers, {args.channels:,} channels", [
+            ("dict of sets (before)", measure(banned_before)),
+            ("BannedWordSets + shared", measure(banned_after)),
+        ]),
+    ]
+    for title, results in rows:
+        print(title)
+        baseline = results[0][1]
+        for name, used in results:
+            print(f"  {name:<26} {used / 2 ** 20:8.1f} MiB  {used / baseline:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
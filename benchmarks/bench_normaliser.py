@@ -0,0 +1,63 @@
+"""
+Messages per second for message flattening: the old per-message re.sub against normaliser.Normaliser.
+
+    python benchmarks/bench_normaliser.py [--messages N]
+"""
+import argparse
+import os
+import random
+import re
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from normaliser import Normaliser  # noqa: E402
+
+
+def legacy(text):
+    return re.sub(r"[^a-zA-Z0-9:]", "", text.lower())
+
+
+def make_messages(count, seed=0):
+    rng = random.Random(seed)
+    words = ["hello", "dog", "cat", ":dog_face:", "lol", "Banana!", "what's", "up?", "hot-dog", "café", "dög", "🐶"]
+    ascii_chars = string.ascii_letters + string.digits + " .,!?:_-"
+    messages = []
+    for i in range(count):
+        if i % 4 == 0:
+            messages.append(" ".join(rng.choice(words) for _ in range(rng.randint(3, 25))))
+        else:
+            messages.append("".join(rng.choice(ascii_chars) for _ in range(rng.randint(10, 200))))
+    return messages
+
+
+def measure(fn, messages, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in messages:
+            fn(text)
+        best = min(best, time.perf_counter() - start)
+    return len(messages) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=50000)
+    args = parser.parse_args()
+
+    messages = make_messages(args.messages)
+    results = [
+        ("re.sub (before)", measure(legacy, messages)),
+        ("Normaliser()", measure(Normaliser(), messages)),
+        ("Normaliser(fold=True)", measure(Normaliser(fold=True), messages)),
+    ]
+    baseline = results[0][1]
+    for name, rate in results:
+        print(f"{name:<24} {rate:>12,.0f} msg/s  {rate / baseline:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
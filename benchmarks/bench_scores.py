@@ -0,0 +1,109 @@
+"""
+Score updates under contention: the old single global RLock against score_store.ScoreStore's striped locks.
+
+Many threads apply a mix of penalties, first-message inits and /score reads to random users, the way Bolt's listener
+pool does. The on_change hook sleeps for --hook-us microseconds to stand in for the leaderboard index and journal.
+
+    python benchmarks/bench_scores.py [--threads 32] [--ops 200000] [--users 10000]
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from score_store import ScoreStore  # noqa: E402
+
+
+class GlobalLockScores:
+    """
+    The previous design: one dict behind one RLock, taken for reads and writes alike.
+    """
+
+    def __init__(self, on_change):
+        self._scores = {}
+        self._lock = threading.RLock()
+        self._on_change = on_change
+
+    def get(self, user_id, default=0):
+        with self._lock:
+            return self._scores.get(user_id, default)
+
+    def add(self, user_id, delta):
+        with self._lock:
+            old = self._scores.get(user_id, 0)
+            new = self._scores[user_id] = old + delta
+            self._on_change(user_id, old, new)
+        return new
+
+    def setdefault(self, user_id, value=0):
+        with self._lock:
+            if user_id in self._scores:
+                return False
+            self._scores[user_id] = value
+            self._on_change(user_id, 0, value)
+        return True
+
+
+def workload(ops, users, seed=0):
+    rng = random.Random(seed)
+    user_ids = [f"U{i:08d}" for i in range(users)]
+    # Mostly clean messages (an init check), some penalties, some /score reads
+    kinds = rng.choices(["init", "penalty", "read"], weights=[70, 10, 20], k=ops)
+    return [(kind, rng.choice(user_ids)) for kind in kinds]
+
+
+def run(store, ops, threads):
+    chunks = [ops[i::threads] for i in range(threads)]
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(chunk):
+        barrier.wait()
+        for kind, user_id in chunk:
+            if kind == "init":
+                store.setdefault(user_id, 0)
+            elif kind == "penalty":
+                store.add(user_id, -1)
+            else:
+                store.get(user_id)
+
+    workers = [threading.Thread(target=worker, args=(chunk,)) for chunk in chunks]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    return len(ops) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--ops", type=int, default=200000)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--stripes", type=int, default=64)
+    parser.add_argument("--hook-us", type=float, default=20, help="time spent in on_change per update")
+    args = parser.parse_args()
+
+    def on_change(user_id, old, new):
+        if args.hook_us:
+            # sleep() releases the GIL, like the index and journal locks and the I/O they stand in for
+            time.sleep(args.hook_us / 1e6)
+
+    ops = workload(args.ops, args.users)
+    results = [
+        ("global RLock (before)", run(GlobalLockScores(on_change), ops, args.threads)),
+        (f"ScoreStore({args.stripes} stripes)", run(ScoreStore(on_change, stripes=args.stripes), ops, args.threads)),
+    ]
+    baseline = results[0][1]
+    print(f"{args.threads} threads, {args.ops:,} ops over {args.users:,} users")
+    for name, rate in results:
+        print(f"{name:<26} {rate:>12,.0f} ops/s  {rate / baseline:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Measures how long app.py takes to start and how much memory it uses, in fresh interpreters.
+
+Reports the time to import app.py (the point where the socket connection can start), the time until the caches
+have loaded in the background, peak RSS, and which AI SDKs were imported. --eager-ai also imports the AI SDKs and
+builds their clients, which is what start-up used to cost. Caches load from the snapshot written by an untimed
+first run; --no-snapshot reads them from the database instead.
+
+    python benchmarks/startup.py --runs 5 --users 100000 --channels 2000 --words 20
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import string
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import json, resource, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.caches_ready.wait()
+ready = time.perf_counter()
+if EAGER_AI:
+    app.openai_client(), app.async_openai_client(), app.gemini_model()
+ai = time.perf_counter()
+print(json.dumps({
+    "import_s": imported - start,
+    "caches_s": ready - start,
+    "ai_s": ai - ready,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "modules": len(sys.modules),
+    "ai_sdks": sorted(m for m in ("openai", "google.generativeai", "grpc") if m in sys.modules),
+}))
+"""
+
+
+def seed(path, users, channels, words):
+    """
+    Fills a fresh SQLite database so cache loading has something to do.
+    """
+    sys.path.insert(0, ROOT)
+    from storage import SQLiteStorage
+
+    rng = random.Random(0)
+    storage = SQLiteStorage(path)
+    storage.write_scores({f"U{i:08d}": -rng.randint(0, 50) for i in range(users)})
+    for c in range(channels):
+        for _ in range(words):
+            storage.ban_word(f"C{c:08d}", "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 9))))
+    storage.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--users", type=int, default=10000, help="scores to seed the database with")
+    parser.add_argument("--channels", type=int, default=500)
+    parser.add_argument("--words", type=int, default=10, help="banned words per channel")
+    parser.add_argument("--eager-ai", action="store_true", help="also import the AI SDKs and build their clients")
+    parser.add_argument("--no-snapshot", action="store_true", help="load the caches from the database every time")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="word-ban-startup-")
+    db = os.path.join(workdir, "startup.sqlite3")
+    seed(db, args.users, args.channels, args.words)
+    env = dict(os.environ, SLACK_BOT_TOKEN="xoxb-benchmark", SLACK_TOKEN_VERIFICATION="0", AI_TOKEN1="benchmark",
+               AI_TOKEN2="benchmark", STORAGE_BACKEND="sqlite", STORAGE_PATH=db, PYTHONPATH=ROOT,
+               SNAPSHOT_PATH="" if args.no_snapshot else os.path.join(workdir, "startup.snapshot"))
+
+    def run():
+        out = subprocess.run([sys.executable, "-c", CHILD.replace("EAGER_AI", str(args.eager_ai))], cwd=workdir,
+                             env=env, capture_output=True, text=True, check=True)
+        return json.loads(out.stdout.strip().splitlines()[-1])
+
+    if not args.no_snapshot:
+        # Writes the snapshot on exit
+        run()
+    results = [run() for _ in range(args.runs)]
+
+    def median(key):
+        return statistics.median(r[key] for r in results)
+
+    print(f"{args.runs} runs, {args.users:,} scores, {args.channels:,} channels x {args.words} banned words")
+    print(f"  import app.py      {median('import_s') * 1000:8.1f} ms   (socket connection can start here)")
+    print(f"  caches loaded      {median('caches_s') * 1000:8.1f} ms   "
+          f"(from {'the database' if args.no_snapshot else 'the snapshot'})")
+    if args.eager_ai:
+        print(f"  AI SDKs + clients  {median('ai_s') * 1000:8.1f} ms")
+    print(f"  peak RSS           {median('max_rss_mb'):8.1f} MB")
+    print(f"  modules imported   {median('modules'):8.0f}")
+    print(f"  AI SDKs imported   {', '.join(results[-1]['ai_sdks']) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
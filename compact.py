@@ -0,0 +1,172 @@
+import sys
+from array import array
+
+# Slack IDs are upper-case letters and digits, 9-11 characters long. Up to 11 fit in 60 bits as base 36,
+# with the length in the low 4 bits so leading zeros survive.
+MAX_PACKED_LENGTH = 11
+# Fibonacci hashing: Slack IDs share long prefixes, so their packed values need mixing before picking a bucket
+_GOLDEN = 0x9E3779B97F4A7C15
+_MASK64 = (1 << 64) - 1
+
+
+def pack_id(slack_id):
+    """
+    A Slack ID as a positive int, or None if it isn't 1-11 upper-case ASCII letters and digits.
+    Raises TypeError for anything but a str, so a missing user (None) can't become a score.
+    """
+    if not isinstance(slack_id, str):
+        raise TypeError(f"a Slack ID must be a str, not {type(slack_id).__name__}")
+    if len(slack_id) <= MAX_PACKED_LENGTH and slack_id.isascii() and slack_id.isalnum() \
+            and (slack_id.isupper() or slack_id.isdigit()):
+        return int(slack_id, 36) << 4 | len(slack_id)
+    return None
+
+
+class IdTable:
+    """
+    Gives each Slack ID a dense slot number (0, 1, 2...) to index typed arrays with.
+    IDs are stored packed in an open-addressing hash table built on arrays: about 24 bytes an ID, where a dict
+    entry plus its str key is over 100. IDs that don't pack go in an ordinary dict.
+    Lookups need no lock; add() must not run in two threads at once.
+    """
+
+    def __init__(self):
+        self._keys = array("q")
+        self._other = {}
+        # Bucket -> slot + 1, or 0 for empty. Replaced whole when it grows, so lookups can read it without a lock.
+        self._index = array("i", bytes(4 * 16))
+
+    def __len__(self):
+        return len(self._keys)
+
+    @staticmethod
+    def _probe(index, keys, key):
+        """
+        (bucket, slot) for a packed key: its bucket and slot, or the empty bucket it would go in and -1.
+        """
+        mask = len(index) - 1
+        i = ((key * _GOLDEN) & _MASK64) >> 32 & mask
+        while True:
+            slot = index[i]
+            if not slot or keys[slot - 1] == key:
+                return i, slot - 1
+            i = (i + 1) & mask
+
+    def find(self, slack_id):
+        """
+        The ID's slot, or -1 if it hasn't been added.
+        """
+        key = pack_id(slack_id)
+        if key is None:
+            return self._other.get(slack_id, -1)
+        return self._probe(self._index, self._keys, key)[1]
+
+    def add(self, slack_id):
+        """
+        The ID's slot, adding it at the end if it's new.
+        """
+        key = pack_id(slack_id)
+        if key is None:
+            slot = self._other.get(slack_id)
+            if slot is None:
+                slot = self._other[slack_id] = len(self._keys)
+                self._keys.append(0)
+            return slot
+        index = self._index
+        i, slot = self._probe(index, self._keys, key)
+        if slot >= 0:
+            return slot
+        slot = len(self._keys)
+        self._keys.append(key)
+        if 2 * len(self._keys) > len(index):
+            self._grow()
+        else:
+            # Published last, so a concurrent find() never sees a bucket without its key
+            index[i] = slot + 1
+        return slot
+
+    def _grow(self):
+        size = 2 * len(self._index)
+        while 2 * len(self._keys) > size:
+            size *= 2
+        index = array("i", bytes(4 * size))
+        for slot, key in enumerate(self._keys):
+            if key:
+                index[self._probe(index, self._keys, key)[0]] = slot + 1
+        self._index = index
+
+
+class BannedWordSets:
+    """
+    Each channel's banned words as a frozenset. Words are interned, so a word banned in many channels is stored once,
+    and channels with identical bans share one set.
+    Writers must be serialised (app.py holds banned_lock); a channel's set is replaced rather than changed, so
+    readers don't lock.
+    """
+
+    def __init__(self):
+        self._channels = {}
+        # Identical sets share one object: the set -> [that object, how many channels use it]
+        self._sets = {}
+
+    def _intern(self, words):
+        if not words:
+            return None
+        entry = self._sets.get(words)
+        if entry is None:
+            words = frozenset(sys.intern(word) for word in words)
+            entry = self._sets[words] = [words, 0]
+        entry[1] += 1
+        return entry[0]
+
+    def _release(self, words):
+        entry = self._sets[words]
+        entry[1] -= 1
+        if not entry[1]:
+            del self._sets[words]
+
+    def _replace(self, channel_id, words):
+        old = self._channels.get(channel_id)
+        new = self._intern(frozenset(words))
+        if new is None:
+            self._channels.pop(channel_id, None)
+        else:
+            self._channels[channel_id] = new
+        if old is not None:
+            self._release(old)
+
+    def get(self, channel_id, default=None):
+        return self._channels.get(channel_id, default)
+
+    def __contains__(self, channel_id):
+        return channel_id in self._channels
+
+    def __len__(self):
+        return len(self._channels)
+
+    def items(self):
+        return self._channels.items()
+
+    def add(self, channel_id, word):
+        self._replace(channel_id, self._channels.get(channel_id, frozenset()) | {word})
+
+    def discard(self, channel_id, word):
+        self._replace(channel_id, self._channels.get(channel_id, frozenset()) - {word})
+
+    def pop(self, channel_id):
+        """
+        Removes a channel's bans and returns them (an empty set if it had none).
+        """
+        words = self._channels.pop(channel_id, None)
+        if words is None:
+            return frozenset()
+        self._release(words)
+        return words
+
+    def update(self, banned: dict):
+        for channel_id, words in banned.items():
+            self._replace(channel_id, words)
+
+    def clear(self):
+        self._channels.clear()
+        self._sets.clear()
@@ -0,0 +1,131 @@
+import hashlib
+import logging
+import os
+import struct
+import threading
+import time
+from array import array
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct("<dQ")
+
+
+def event_key(body):
+    """
+    What identifies a delivery of this request, or None if it isn't an event. Slack keeps the event_id across
+    retries; channel + ts is the fallback for payloads without one.
+    """
+    if body.get("type") != "event_callback":
+        return None
+    if body.get("event_id"):
+        return body["event_id"]
+    event = body.get("event") or {}
+    if event.get("channel") and event.get("ts"):
+        return f"{event.get('type')}:{event['channel']}:{event['ts']}"
+    return None
+
+
+def _fingerprint(key):
+    # 64 bits is plenty to tell apart the few hundred thousand events a day that can be live at once
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little")
+
+
+class DedupCache:
+    """
+    Remembers which events were handled in the last `ttl` seconds so Slack's redeliveries can be dropped.
+    Keys are kept as 64-bit fingerprints in two generations of sets: when the current one is `ttl / 2` old or
+    holds maxsize / 2 keys it becomes the previous one and the old previous is dropped whole. A key is remembered
+    for at most ttl. That is at least ttl / 2 while traffic stays under maxsize / 2 events per ttl / 2; a busier
+    burst rotates sooner and forgets keys earlier, so memory never goes past about maxsize fingerprints.
+    With `path` set the fingerprints are written there on close and read back on start.
+    """
+
+    def __init__(self, ttl=600.0, maxsize=100_000, path=None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.path = path
+        self.checked = 0
+        self.dropped = 0
+        self._current = set()
+        self._previous = set()
+        self._started = time.time()
+        self._previous_started = self._started
+        self._lock = threading.Lock()
+        if path:
+            self._load()
+
+    def _rotate(self, now):
+        self._previous, self._previous_started = self._current, self._started
+        self._current = set()
+        self._started = now
+
+    def seen(self, key):
+        """
+        True if `key` was already recorded. Otherwise records it and returns False.
+        """
+        fingerprint = _fingerprint(key)
+        now = time.time()
+        with self._lock:
+            self.checked += 1
+            # Aged out before the lookup, so a quiet spell can't leave keys answering past ttl
+            if now - self._previous_started >= self.ttl:
+                self._previous = set()
+            if now - self._started >= self.ttl:
+                # Idle for a whole ttl: the current generation has expired too
+                self._current = set()
+            if now - self._started >= self.ttl / 2:
+                self._rotate(now)
+            if fingerprint in self._current or fingerprint in self._previous:
+                self.dropped += 1
+                return True
+            if len(self._current) >= self.maxsize // 2:
+                self._rotate(now)
+            self._current.add(fingerprint)
+            return False
+
+    def __len__(self):
+        return len(self._current) + len(self._previous)
+
+    def _load(self):
+        """
+        Reads back the generations that are still within ttl. The file is two (start time, count, fingerprints) blocks.
+        """
+        try:
+            with open(self.path, "rb") as f:
+                generations = []
+                for _ in range(2):
+                    started, count = _HEADER.unpack(f.read(_HEADER.size))
+                    fingerprints = array("Q")
+                    fingerprints.fromfile(f, count)
+                    generations.append((started, fingerprints))
+        except FileNotFoundError:
+            return
+        except (OSError, EOFError, struct.error) as e:
+            logger.warning(f"Ignoring unreadable dedup file {self.path}: {e}")
+            return
+        now = time.time()
+        (current_started, current), (previous_started, previous) = generations
+        if now - previous_started < self.ttl:
+            self._previous, self._previous_started = set(previous), previous_started
+        if now - current_started < self.ttl:
+            self._current, self._started = set(current), current_started
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            generations = [(self._started, array("Q", self._current)),
+                           (self._previous_started, array("Q", self._previous))]
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "wb") as f:
+            for started, fingerprints in generations:
+                f.write(_HEADER.pack(started, len(fingerprints)))
+                fingerprints.tofile(f)
+        os.replace(tmp, self.path)
+
+    def close(self):
+        try:
+            self.save()
+        except OSError as e:
+            logger.error(f"Could not save dedup cache to {self.path}: {e}")
@@ -0,0 +1,42 @@
+import re
+
+# Mentions longer than this are left to the AI classifier; short ones are usually just a command
+MAX_WORDS = 8
+
+# Checked in order, so the more specific patterns come first
+# Matched against the whole mention (the @bot part is already removed), so a command word in ordinary chat
+# ("can you unban my friend lol") goes to the AI rather than being taken as a command.
+RULES = [
+    ("UNBAN_WORD", re.compile(r"^((how (do|can) i|can you|could you|pls|please) )?unban (a |the |this )?word\b")),
+    ("BANNED_WORDS", re.compile(r"^((show|list|show me) )?(the |all )?(banned words|banned list|list of (the )?banned words)"
+                                r"( here| in this channel)?$"
+                                r"|^(what(s| is| are)|(what|which) words are) banned( here| in this channel)?$")),
+    ("BAN_WORD", re.compile(r"^((how (do|can) i|can you|could you|pls|please) )?ban (a |the |this )?word\b")),
+    ("LEADERBOARD", re.compile(r"^((show|show me|whats|what is) )?(the )?(leaderboard|leader board|top 10)$"
+                               r"|^who is (the )?(most )?naughty$")),
+    ("SCORE", re.compile(r"^((what(s| is) )?my score|score|(what|whats) is my score|show my score)$")),
+    ("REFLECT", re.compile(r"^((how (do|can) i )?(submit |write |do )?(a )?reflect(ion)?|reflect)$")),
+    ("HELP", re.compile(r"^(help|commands|what can you do|what are your commands|how do i use you|what do you do)$")),
+]
+
+_STRIP = re.compile(r"[^a-z0-9 ]+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalise(text):
+    text = _STRIP.sub("", text.lower().replace("'", ""))
+    return _SPACES.sub(" ", text).strip()
+
+
+def classify_intent(text):
+    """
+    Resolves obvious mention intents (the same keywords the AI classifier returns) without a network call.
+    Returns None when the text is ambiguous and should go to the AI.
+    """
+    text = normalise(text)
+    if not text or len(text.split(" ")) > MAX_WORDS:
+        return None
+    for intent, pattern in RULES:
+        if pattern.search(text):
+            return intent
+    return None
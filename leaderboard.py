@@ -0,0 +1,68 @@
+from bisect import bisect_left
+from threading import RLock
+
+
+class ScoreIndex:
+    """
+    Keeps every non-zero score in leaderboard order (lowest score first, then user ID) as scores change,
+    so the top N and a user's rank are a slice and a binary search instead of a full sort.
+    """
+
+    def __init__(self, render, size=10):
+        # render(list of (user_id, score)) -> Slack blocks for the top `size` users
+        self._render = render
+        self.size = size
+        self._entries = []
+        self._lock = RLock()
+        self._blocks = None
+
+    def load(self, scores: dict):
+        with self._lock:
+            self._entries = sorted((score, user_id) for user_id, score in scores.items() if score != 0)
+            self._blocks = None
+
+    def update(self, user_id, old, new):
+        if old == new:
+            return
+        with self._lock:
+            entries = self._entries
+            changed_top = False
+            if old:
+                i = bisect_left(entries, (old, user_id))
+                if i < len(entries) and entries[i] == (old, user_id):
+                    del entries[i]
+                    changed_top = i < self.size
+            if new:
+                i = bisect_left(entries, (new, user_id))
+                entries.insert(i, (new, user_id))
+                changed_top = changed_top or i < self.size
+            if changed_top:
+                self._blocks = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def top(self, n=None):
+        with self._lock:
+            return [(user_id, score) for score, user_id in self._entries[:n or self.size]]
+
+    def rank(self, user_id, score):
+        """
+        1-based leaderboard position of a user with the given score, or None if they aren't on it.
+        """
+        if not score:
+            return None
+        with self._lock:
+            i = bisect_left(self._entries, (score, user_id))
+            if i < len(self._entries) and self._entries[i] == (score, user_id):
+                return i + 1
+        return None
+
+    def blocks(self):
+        """
+        The rendered top-N blocks, rebuilt only after the top N has changed.
+        """
+        with self._lock:
+            if self._blocks is None:
+                self._blocks = self._render(self.top())
+            return self._blocks
@@ -0,0 +1,112 @@
+import threading
+import weakref
+from collections import deque
+
+# Up to this many words, one str.find per word (in C) beats walking the automaton in Python, and needs no tables
+FIND_LIMIT = 32
+
+
+class BannedWordMatcher:
+    """
+    Immutable Aho-Corasick automaton over a channel's banned words (or, for a handful of words, just the words).
+    Build a new one whenever the word set changes and swap it in; readers never need a lock.
+    """
+
+    __slots__ = ("words", "_goto", "_fail", "_out", "__weakref__")
+
+    def __init__(self, words):
+        self.words = frozenset(word for word in words if word)
+        if len(self.words) <= FIND_LIMIT:
+            self._goto = self._fail = None
+            self._out = tuple(sorted(self.words))
+            return
+        goto = [{}]
+        out = [None]
+        # Sorted so the automaton (and therefore every match) is identical across restarts
+        for word in sorted(self.words):
+            node = 0
+            for char in word:
+                nxt = goto[node].get(char)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[node][char] = nxt
+                    goto.append({})
+                    out.append(None)
+                node = nxt
+            out[node] = word
+
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in goto[node].items():
+                queue.append(child)
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                fail[child] = goto[state].get(char, 0)
+                # A node's own word is always the longest one ending there
+                if out[child] is None:
+                    out[child] = out[fail[child]]
+
+        self._goto = goto
+        self._fail = fail
+        self._out = out
+
+    def __bool__(self):
+        return bool(self.words)
+
+    def __len__(self):
+        return len(self.words)
+
+    def first_match(self, text: str):
+        """
+        Scans text once and returns the banned word that ends earliest in it (longest wins a tie), or None.
+        """
+        goto = self._goto
+        if goto is None:
+            return self._find_first(text)
+        fail = self._fail
+        out = self._out
+        node = 0
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if out[node] is not None:
+                return out[node]
+        return None
+
+    def _find_first(self, text):
+        best = None
+        best_end = len(text) + 1
+        for word in self._out:
+            # Only an occurrence that ends no later than the best so far can win
+            i = text.find(word, 0, best_end)
+            if i >= 0:
+                end = i + len(word)
+                if end < best_end or len(word) > len(best):
+                    best, best_end = word, end
+        return best
+
+
+EMPTY_MATCHER = BannedWordMatcher(())
+
+
+# Matchers by word set, so channels with the same bans share one automaton. Entries go when no channel uses them.
+_shared = weakref.WeakValueDictionary()
+_shared_lock = threading.Lock()
+
+
+def shared_matcher(words):
+    """
+    A matcher for words, reusing the one already built for an identical set if there is one.
+    """
+    words = frozenset(word for word in words if word)
+    with _shared_lock:
+        matcher = _shared.get(words)
+        if matcher is None:
+            matcher = BannedWordMatcher(words)
+            # Keyed by the matcher's own set, so the entry adds no second copy of the words
+            _shared[matcher.words] = matcher
+    return matcher
@@ -0,0 +1,387 @@
+import functools
+import inspect
+import logging
+import os
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections import Counter as _Tally
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger(__name__)
+
+# METRICS_PORT > 0 turns instrumentation on and serves /metrics there. Off, every helper hands back the plain object.
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+# METRICS_PROFILER=1 also serves /debug/profile, a sampling profiler that only runs while a request asks for it
+METRICS_PROFILER = os.environ.get("METRICS_PROFILER", "0") == "1"
+enabled = METRICS_PORT > 0
+
+# Seconds. Handlers and storage sit in the low milliseconds; lock waits are usually microseconds.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LOCK_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class _Family(ABC):
+    """
+    A metric and its children, one per combination of label values. `labels(*values)` returns the child to update;
+    keep it rather than looking it up on every call.
+    """
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def _new_child(self):
+        """A fresh child for a new combination of label values."""
+
+    def labels(self, *values):
+        with self._lock:
+            child = self._children.get(values)
+            if child is None:
+                child = self._children[values] = self._new_child()
+            return child
+
+    def _items(self):
+        with self._lock:
+            return list(self._children.items())
+
+
+class Histogram(_Family):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def render(self):
+        for values, child in self._items():
+            with child._lock:
+                counts, total, count = list(child.counts), child.sum, child.count
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, values)} {total}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, values)} {count}"
+
+
+class Counter(_Family):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def render(self):
+        for values, child in self._items():
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {child.value}"
+
+
+class Gauge:
+    """
+    Read at scrape time: `collect()` returns (label values, value) pairs, so nothing is kept up to date in between.
+    """
+
+    def __init__(self, name, help, labelnames, collect, kind="gauge"):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+        self.kind = kind
+
+    def render(self):
+        try:
+            samples = list(self.collect())
+        except Exception as e:
+            logger.warning(f"Metric {self.name} could not be collected: {e}")
+            return
+        for values, value in samples:
+            if value is not None:
+                yield f"{self.name}{_format_labels(self.labelnames, values)} {value}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HANDLER_SECONDS = REGISTRY.register(Histogram(
+    "wordban_handler_seconds", "Time spent in each Slack listener", ["handler"]))
+HANDLER_ERRORS = REGISTRY.register(Counter(
+    "wordban_handler_errors_total", "Listener calls that raised", ["handler"]))
+LOCK_WAIT_SECONDS = REGISTRY.register(Histogram(
+    "wordban_lock_wait_seconds", "Time spent waiting to acquire a lock", ["lock"], LOCK_BUCKETS))
+LOCK_HOLD_SECONDS = REGISTRY.register(Histogram(
+    "wordban_lock_hold_seconds", "Time a lock was held, outermost acquire to release", ["lock"], LOCK_BUCKETS))
+STORAGE_SECONDS = REGISTRY.register(Histogram(
+    "wordban_storage_seconds", "Latency of each storage operation", ["op"]))
+STORAGE_ERRORS = REGISTRY.register(Counter(
+    "wordban_storage_errors_total", "Storage operations that raised", ["op"]))
+
+
+def gauge(name, help, labelnames, collect, kind="gauge"):
+    """
+    Registers a metric whose samples come from `collect()` at scrape time.
+    """
+    return REGISTRY.register(Gauge(name, help, labelnames, collect, kind))
+
+
+def timed(handler):
+    """
+    Decorator recording a listener's latency under `handler`. Works on sync and async functions and keeps the
+    signature, so Bolt still injects the same arguments.
+    """
+    def decorate(fn):
+        if not enabled:
+            return fn
+        seconds = HANDLER_SECONDS.labels(handler)
+        errors = HANDLER_ERRORS.labels(handler)
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def timed_async(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                except Exception:
+                    errors.inc()
+                    raise
+                finally:
+                    seconds.observe(time.perf_counter() - start)
+
+            return timed_async
+
+        @functools.wraps(fn)
+        def timed_sync(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                seconds.observe(time.perf_counter() - start)
+
+        return timed_sync
+
+    return decorate
+
+
+class InstrumentedLock:
+    """
+    RLock that records how long callers waited for it and how long it was held. Re-entrant acquires only count once.
+    """
+
+    def __init__(self, name):
+        self._lock = threading.RLock()
+        self._wait = LOCK_WAIT_SECONDS.labels(name)
+        self._hold = LOCK_HOLD_SECONDS.labels(name)
+        self._local = threading.local()
+
+    def acquire(self, blocking=True, timeout=-1):
+        start = time.perf_counter()
+        if not self._lock.acquire(blocking, timeout):
+            return False
+        now = time.perf_counter()
+        depth = getattr(self._local, "depth", 0)
+        if depth == 0:
+            self._wait.observe(now - start)
+            self._local.since = now
+        self._local.depth = depth + 1
+        return True
+
+    def release(self):
+        self._local.depth -= 1
+        if self._local.depth == 0:
+            self._hold.observe(time.perf_counter() - self._local.since)
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def lock(name):
+    """
+    An RLock, instrumented as `name` when metrics are on.
+    """
+    return InstrumentedLock(name) if enabled else threading.RLock()
+
+
+class _InstrumentedStorage:
+    """
+    Proxies a Storage, timing every method call.
+    """
+
+    def __init__(self, inner):
+        self._inner = inner
+
+    def __getattr__(self, name):
+        attr = getattr(self._inner, name)
+        if not callable(attr) or name.startswith("_"):
+            return attr
+        seconds = STORAGE_SECONDS.labels(name)
+        errors = STORAGE_ERRORS.labels(name)
+
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return attr(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                seconds.observe(time.perf_counter() - start)
+
+        # Cache the wrapper so later lookups skip __getattr__
+        setattr(self, name, call)
+        return call
+
+
+def instrument_storage(storage):
+    return _InstrumentedStorage(storage) if enabled else storage
+
+
+class SamplingProfiler:
+    """
+    Samples every thread's stack every `interval` seconds and tallies them in folded form
+    ("module:function;module:function count"), which flamegraph.pl and speedscope read directly.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self._busy = threading.Lock()
+
+    def run(self, seconds):
+        if not self._busy.acquire(blocking=False):
+            return None
+        try:
+            tally = _Tally()
+            me = threading.get_ident()
+            names = {}
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                for ident, frame in sys._current_frames().items():
+                    if ident == me:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                        frame = frame.f_back
+                    thread = names.get(ident)
+                    if thread is None:
+                        thread = names[ident] = next(
+                            (t.name for t in threading.enumerate() if t.ident == ident), str(ident))
+                    tally[";".join([thread, *reversed(stack)])] += 1
+                time.sleep(self.interval)
+            return "\n".join(f"{stack} {count}" for stack, count in tally.most_common()) + "\n"
+        finally:
+            self._busy.release()
+
+
+profiler = SamplingProfiler()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/metrics":
+            self._reply(200, REGISTRY.render(), "text/plain; version=0.0.4")
+        elif url.path == "/debug/profile" and METRICS_PROFILER:
+            seconds = min(float(parse_qs(url.query).get("seconds", ["10"])[0]), 300)
+            folded = profiler.run(seconds)
+            if folded is None:
+                self._reply(409, "A profile is already running\n", "text/plain")
+            else:
+                self._reply(200, folded, "text/plain")
+        else:
+            self._reply(404, "Not found\n", "text/plain")
+
+    def _reply(self, status, body, content_type):
+        data = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug("metrics %s", format % args)
+
+
+def serve(host=METRICS_HOST, port=METRICS_PORT):
+    """
+    Serves /metrics (and /debug/profile if enabled) from a daemon thread.
+    """
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,66 @@
+import os
+import unicodedata
+
+# Characters that survive flattening; everything else (spaces, punctuation, underscores...) is dropped
+KEEP = frozenset("abcdefghijklmnopqrstuvwxyz0123456789:")
+
+# Look-alike letters NFKD leaves alone, mapped to the ASCII letter they imitate
+CONFUSABLES = {
+    "а": "a", "в": "b", "е": "e", "ё": "e", "к": "k", "м": "m", "н": "h", "о": "o", "р": "p", "с": "c",
+    "т": "t", "у": "y", "х": "x", "і": "i", "ї": "i", "ј": "j", "ѕ": "s", "ԁ": "d", "ԛ": "q", "ԝ": "w",
+    "α": "a", "β": "b", "ε": "e", "η": "n", "ι": "i", "κ": "k", "ν": "v", "ο": "o", "ρ": "p", "τ": "t",
+    "υ": "u", "χ": "x", "ø": "o", "đ": "d", "ħ": "h", "ı": "i", "ł": "l", "œ": "oe", "æ": "ae", "ß": "ss",
+    "þ": "th", "ð": "d",
+}
+
+# bytes.translate tables for the all-ASCII fast path: lowercase, then drop anything not in KEEP
+_ASCII_LOWER = bytes(range(256)).lower()
+_ASCII_DROP = bytes(b for b in range(128) if chr(b).lower() not in KEEP)
+
+
+def _plain(char):
+    kept = "".join(c for c in char.lower() if c in KEEP)
+    return kept or None
+
+
+def _folded(char):
+    folded = []
+    for c in unicodedata.normalize("NFKD", char.casefold()):
+        c = CONFUSABLES.get(c, c)
+        folded.extend(x for x in c if x in KEEP)
+    return "".join(folded) or None
+
+
+class _Table(dict):
+    """
+    str.translate mapping that works out each code point's replacement the first time it is seen.
+    """
+
+    def __init__(self, fold):
+        super().__init__()
+        self._fold = fold
+
+    def __missing__(self, codepoint):
+        value = (_folded if self._fold else _plain)(chr(codepoint))
+        self[codepoint] = value
+        return value
+
+
+class Normaliser:
+    """
+    Flattens text for banned-word matching in one pass: lowercase and strip everything but a-z, 0-9 and ':'.
+    With fold=True accents are removed (NFKD) and common look-alike letters become ASCII, so "dög" reads as "dog".
+    """
+
+    def __init__(self, fold=False):
+        self.fold = fold
+        self._table = _Table(fold)
+
+    def __call__(self, text):
+        if text.isascii():
+            return text.encode().translate(_ASCII_LOWER, _ASCII_DROP).decode()
+        return text.translate(self._table)
+
+
+# The normaliser the bot uses for both banning and scanning. NORMALISE_FOLD=1 turns on Unicode folding.
+normalise = Normaliser(fold=os.environ.get("NORMALISE_FOLD", "0") == "1")
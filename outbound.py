@@ -0,0 +1,149 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+
+from slack_sdk.errors import SlackApiError
+
+logger = logging.getLogger(__name__)
+
+
+def retry_after(error):
+    """
+    Seconds Slack asked us to back off for, or None if the error isn't a rate limit.
+    """
+    response = getattr(error, "response", None)
+    if response is None or response.status_code != 429:
+        return None
+    headers = response.headers or {}
+    value = headers.get("Retry-After") or headers.get("retry-after") or 1
+    return float(value)
+
+
+class OutboundDispatcher:
+    """
+    Sends bot replies from background threads so handlers never wait on chat.postMessage.
+    Each channel gets at most one message per `interval` seconds and a 429 pauses all sending for its Retry-After.
+    With collapse_window set, collapsible messages that pile up in a channel are merged with `summarise`.
+    """
+
+    def __init__(self, client, interval=1.0, collapse_window=0.0, summarise=None, workers=4):
+        self.client = client
+        self.interval = interval
+        self.collapse_window = collapse_window
+        self.summarise = summarise
+        self._queues = {}
+        self._last_sent = {}
+        self._ready = []
+        self._seq = itertools.count()
+        self._paused_until = 0.0
+        self._cond = threading.Condition()
+        self._stopped = False
+        self.counts = {"sent": 0, "collapsed": 0, "rate_limited": 0, "failed": 0}
+        self._threads = [
+            threading.Thread(target=self._run, name=f"outbound-{i}", daemon=True) for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def send(self, channel, text, thread_ts=None, summary=None):
+        """
+        Queues a message. `summary` marks it collapsible and is the item handed to summarise().
+        """
+        message = {"text": text, "thread_ts": thread_ts, "summary": summary}
+        with self._cond:
+            queue = self._queues.get(channel)
+            if queue is not None:
+                queue.append(message)
+                return
+            self._queues[channel] = deque([message])
+            now = time.monotonic()
+            ready_at = max(now + (self.collapse_window if summary is not None else 0),
+                           self._last_sent.get(channel, 0) + self.interval)
+            heapq.heappush(self._ready, (ready_at, next(self._seq), channel))
+            self._cond.notify()
+
+    def pending(self):
+        with self._cond:
+            return sum(len(queue) for queue in self._queues.values())
+
+    def _take(self, channel):
+        queue = self._queues[channel]
+        first = queue.popleft()
+        if first["summary"] is None or not self.collapse_window or self.summarise is None:
+            return [first]
+        batch = [first]
+        while queue and queue[0]["summary"] is not None:
+            batch.append(queue.popleft())
+        return batch
+
+    def _next(self):
+        with self._cond:
+            while True:
+                if self._stopped and not self._ready:
+                    return None, None
+                now = time.monotonic()
+                if self._ready:
+                    wake = max(self._ready[0][0], self._paused_until)
+                    if wake <= now:
+                        channel = heapq.heappop(self._ready)[2]
+                        return channel, self._take(channel)
+                    self._cond.wait(wake - now)
+                else:
+                    self._cond.wait()
+
+    def _run(self):
+        while True:
+            channel, batch = self._next()
+            if channel is None:
+                return
+            if len(batch) > 1:
+                message = {"text": self.summarise([m["summary"] for m in batch]), "thread_ts": None}
+            else:
+                message = batch[0]
+            requeue = False
+            ok = False
+            try:
+                kwargs = {"channel": channel, "text": message["text"]}
+                if message.get("thread_ts"):
+                    kwargs["thread_ts"] = message["thread_ts"]
+                self.client.chat_postMessage(**kwargs)
+                ok = True
+            except SlackApiError as e:
+                wait = retry_after(e)
+                if wait is not None:
+                    logger.warning(f"Rate limited posting to {channel}, backing off {wait}s")
+                    requeue = True
+                else:
+                    logger.error(f"Failed to post to {channel}: {e}")
+            except Exception as e:
+                logger.error(f"Failed to post to {channel}: {e}")
+            with self._cond:
+                now = time.monotonic()
+                if requeue:
+                    self.counts["rate_limited"] += 1
+                    self._paused_until = max(self._paused_until, now + wait)
+                    self._queues[channel].extendleft(reversed(batch))
+                else:
+                    self._last_sent[channel] = now
+                    if len(batch) > 1:
+                        self.counts["collapsed"] += len(batch) - 1
+                    self.counts["sent" if ok else "failed"] += 1
+                if self._queues[channel]:
+                    heapq.heappush(self._ready, (now + self.interval, next(self._seq), channel))
+                    self._cond.notify()
+                else:
+                    del self._queues[channel]
+
+    def close(self, timeout=5.0):
+        """
+        Stops accepting new work once the queues have drained (or timeout passes).
+        """
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0, deadline - time.monotonic()))
@@ -0,0 +1,57 @@
+import threading
+import time
+
+# Requests per minute for the Slack Web API rate limit tiers (https://api.slack.com/apis/rate-limits)
+SLACK_TIERS = {
+    1: 1,
+    2: 20,
+    3: 50,
+    4: 100,
+}
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. acquire() blocks until a token is free, so callers are paced to `per_minute`.
+    """
+
+    def __init__(self, per_minute, burst=None):
+        self.rate = per_minute / 60
+        self.capacity = burst if burst is not None else max(1, per_minute // 10)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self):
+        """
+        Takes a token and returns how long the caller has to wait before using it.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        wait = self.delay()
+        if wait:
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """
+        Empties the bucket for `seconds`, e.g. after Slack answers with a Retry-After.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens = min(self._tokens, 0) - seconds * self.rate
+
+
+def slack_bucket(tier):
+    return TokenBucket(SLACK_TIERS[tier])
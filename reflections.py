@@ -0,0 +1,64 @@
+import heapq
+import itertools
+import threading
+import time
+
+# How long the channel gets to vote on a reflection
+VOTING_PERIOD = 86400
+
+
+class ReflectionScheduler:
+    """
+    Min-heap of pending reflections keyed on when their vote closes.
+    The worker sleeps until the earliest deadline and is woken early when a sooner one is added.
+    """
+
+    def __init__(self, voting_period=VOTING_PERIOD):
+        self.voting_period = voting_period
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._stopped = False
+
+    def add(self, record, deadline=None):
+        if deadline is None:
+            deadline = record["created_at"] + self.voting_period
+        with self._cond:
+            heapq.heappush(self._heap, (deadline, next(self._seq), record))
+            if self._heap[0][2] is record:
+                self._cond.notify()
+
+    def retry(self, record, delay):
+        """Puts a reflection that failed to process back on the heap to try again after delay seconds."""
+        self.add(record, time.time() + delay)
+
+    def __len__(self):
+        with self._cond:
+            return len(self._heap)
+
+    def wait_due(self):
+        """
+        Blocks until at least one reflection's vote has closed, then pops and returns all that have.
+        Returns an empty list once stop() has been called.
+        """
+        with self._cond:
+            while not self._stopped:
+                if self._heap:
+                    remaining = self._heap[0][0] - time.time()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                else:
+                    self._cond.wait()
+            if self._stopped:
+                return []
+            now = time.time()
+            due = []
+            while self._heap and self._heap[0][0] <= now:
+                due.append(heapq.heappop(self._heap)[2])
+            return due
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
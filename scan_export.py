@@ -0,0 +1,213 @@
+"""
+Audits a Slack workspace export against the bot's banned words, without the bot running.
+
+An export is a directory with one folder per channel and one JSON file of messages per day. Each message is
+flattened and matched exactly as the bot does it live, and files are spread over a pool of worker processes.
+Bans are read, never written, from the bot's database (STORAGE_PATH, or --storage-path); STORAGE_BACKEND=dbm reads
+them from banned_words.db. A missing database or an empty ban list is an error.
+
+Writes users.csv and channels.csv (messages and violations) to --out, and with --adjustments a JSON file of
+user ID -> points to take off. Prints messages per second at the end.
+
+    python scan_export.py ~/exports/acme --out audit --adjustments audit/adjustments.json
+"""
+import argparse
+import csv
+import dbm
+import json
+import multiprocessing
+import os
+import pathlib
+import sqlite3
+import sys
+import time
+from collections import Counter
+
+from matcher import EMPTY_MATCHER, shared_matcher
+from normaliser import normalise
+from storage import LEGACY_BANNED_WORDS_DB
+
+# Bytes read from an export file at a time; a message is parsed as soon as it has been read
+READ_SIZE = 1 << 16
+# The export's listings of conversations. DMs are stored under their ID, everything else under its name.
+CONVERSATION_LISTS = ("channels.json", "groups.json", "mpims.json", "dms.json")
+
+_decoder = json.JSONDecoder()
+# Set in each worker by _init_worker
+_matchers = {}
+
+
+def iter_messages(path):
+    """
+    Yields the messages in one export file (a JSON array) one at a time, without loading the whole file.
+    """
+    with open(path, encoding="utf-8") as f:
+        buffer = f.read(READ_SIZE).lstrip()
+        if not buffer.startswith("["):
+            raise ValueError(f"{path} is not a JSON array")
+        pos = 1
+        eof = False
+        while True:
+            # Skip whitespace and the comma between messages, reading more if the buffer runs out first
+            while True:
+                while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                    pos += 1
+                if pos < len(buffer) or eof:
+                    break
+                buffer, pos = f.read(READ_SIZE), 0
+                eof = not buffer
+            if pos >= len(buffer) or buffer[pos] == "]":
+                return
+            try:
+                message, end = _decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # The message runs past the buffer: keep what's left and read more
+                more = f.read(READ_SIZE)
+                eof = not more
+                buffer, pos = buffer[pos:] + more, 0
+                continue
+            yield message
+            pos = end
+
+
+def conversation_folders(export_dir):
+    """
+    (channel ID, folder) for every conversation folder in the export. Folders the listings don't mention are
+    assumed to be named after their ID.
+    """
+    ids = {}
+    for listing in CONVERSATION_LISTS:
+        path = os.path.join(export_dir, listing)
+        if not os.path.exists(path):
+            continue
+        with open(path, encoding="utf-8") as f:
+            for conversation in json.load(f):
+                ids[conversation.get("name") or conversation["id"]] = conversation["id"]
+    for entry in sorted(os.scandir(export_dir), key=lambda entry: entry.name):
+        if entry.is_dir():
+            yield ids.get(entry.name, entry.name), entry.path
+
+
+def export_files(export_dir, channels):
+    """
+    (channel ID, day file) for every day of the channels that have bans, biggest first, so the pool doesn't end on
+    one large file.
+    """
+    files = []
+    for channel_id, folder in conversation_folders(export_dir):
+        if channel_id not in channels:
+            continue
+        for entry in os.scandir(folder):
+            if entry.name.endswith(".json") and entry.is_file():
+                files.append((entry.stat().st_size, channel_id, entry.path))
+    files.sort(reverse=True)
+    return [(channel_id, path) for _, channel_id, path in files]
+
+
+def _init_worker(banned):
+    global _matchers
+    _matchers = {channel: shared_matcher(normalise(word) for word in words) for channel, words in banned.items()}
+
+
+def scan_file(job):
+    """
+    Scans one day file. Returns (channel ID, messages scanned, {user: violations}).
+    """
+    channel_id, path = job
+    matcher = _matchers.get(channel_id, EMPTY_MATCHER)
+    scanned = 0
+    hits = Counter()
+    for message in iter_messages(path):
+        user = message.get("user")
+        if message.get("type", "message") != "message" or user is None or message.get("bot_id"):
+            continue
+        scanned += 1
+        # The same flattening and matching as live messages: at most one violation a message
+        if matcher.first_match(normalise(message.get("text", ""))) is not None:
+            hits[user] += 1
+    return channel_id, scanned, hits
+
+
+def load_bans(args):
+    """
+    Channel ID -> banned words, read without creating or changing anything. Exits if there are none to read.
+    """
+    if os.environ.get("STORAGE_BACKEND", "sqlite").lower() == "dbm" and not args.storage_path:
+        source = LEGACY_BANNED_WORDS_DB
+        if not dbm.whichdb(source):
+            sys.exit(f"No banned words database at {source}")
+        banned = {}
+        with dbm.open(source, "r") as db:
+            for key in db.keys():
+                channel, sep, word = key.decode().partition(":")
+                if sep:
+                    banned.setdefault(channel, set()).add(word)
+    else:
+        source = args.storage_path or os.environ.get("STORAGE_PATH", "word_ban.sqlite3")
+        if not os.path.isfile(source):
+            sys.exit(f"No database at {source}")
+        conn = sqlite3.connect(f"{pathlib.Path(source).absolute().as_uri()}?mode=ro", uri=True)
+        try:
+            rows = conn.execute("SELECT channel, word FROM banned_words").fetchall()
+        except sqlite3.Error as e:
+            sys.exit(f"Could not read banned words from {source}: {e}")
+        finally:
+            conn.close()
+        banned = {}
+        for channel, word in rows:
+            banned.setdefault(channel, set()).add(word)
+    if not banned:
+        sys.exit(f"No banned words in {source}")
+    return banned
+
+
+def write_csv(path, header, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("export", help="unzipped Slack export directory")
+    parser.add_argument("--out", default=".", help="directory to write users.csv and channels.csv to")
+    parser.add_argument("--adjustments", help="also write user ID -> score change (minus one a violation) here")
+    parser.add_argument("--storage-path", help="SQLite database to read bans from instead of STORAGE_PATH")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    banned = load_bans(args)
+    files = export_files(args.export, banned)
+    print(f"Scanning {len(files):,} day files from {len(banned):,} channels with bans", file=sys.stderr)
+
+    by_user = Counter()
+    by_channel = {}
+    scanned = 0
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.workers, initializer=_init_worker, initargs=(banned,)) as pool:
+        for channel_id, count, hits in pool.imap_unordered(scan_file, files, chunksize=8):
+            scanned += count
+            by_user.update(hits)
+            channel = by_channel.setdefault(channel_id, [0, 0])
+            channel[0] += count
+            channel[1] += sum(hits.values())
+    elapsed = time.perf_counter() - start
+
+    os.makedirs(args.out, exist_ok=True)
+    write_csv(os.path.join(args.out, "users.csv"), ["user", "violations"], by_user.most_common())
+    write_csv(os.path.join(args.out, "channels.csv"), ["channel", "messages", "violations"],
+              sorted(((channel_id, *counts) for channel_id, counts in by_channel.items()), key=lambda row: -row[2]))
+    if args.adjustments:
+        with open(args.adjustments, "w", encoding="utf-8") as f:
+            json.dump({user: -count for user, count in by_user.most_common()}, f, indent=1)
+
+    print(f"{scanned:,} messages in {elapsed:.1f} s ({scanned / max(elapsed, 1e-9):,.0f} msg/s, "
+          f"{args.workers} workers): {sum(by_user.values()):,} violations by {len(by_user):,} users",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
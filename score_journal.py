@@ -0,0 +1,140 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ScoreJournal:
+    """
+    Write-behind buffer for score changes.
+    Scores are recorded in memory straight away and written out in batches by a background thread,
+    either when max_batch users are dirty or max_loss_ms has passed since the oldest unflushed change.
+    Several writes for the same user between flushes collapse into one.
+    After a failed write the next attempt waits max_loss_ms, doubling on each further failure up to max_backoff_ms,
+    so a storage outage doesn't turn into a busy loop.
+    When a batch fails but some of its users can be written on their own, storage is up and the rest are bad data:
+    those are dropped rather than retried, so one bad key can't hold every later flush hostage.
+    """
+
+    def __init__(self, write_batch, max_loss_ms=1000, max_batch=100, max_backoff_ms=60000):
+        # write_batch(dict of user_id -> score) persists one batch; it must raise on failure
+        self._write_batch = write_batch
+        self.max_loss_ms = max_loss_ms
+        self.max_batch = max_batch
+        self.max_backoff_ms = max_backoff_ms
+        self.failures = 0
+        # monotonic time before which the background thread doesn't retry a failed write
+        self._retry_at = None
+        self._dirty = {}
+        self._oldest = None
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._thread = None
+        if max_loss_ms > 0:
+            self._thread = threading.Thread(target=self._run, name="score-journal", daemon=True)
+            self._thread.start()
+
+    def record(self, user_id, score):
+        if self.max_loss_ms <= 0:
+            # Durability over throughput: write through immediately
+            with self._cond:
+                self._dirty[user_id] = score
+            self.flush()
+            return
+        with self._cond:
+            if not self._dirty:
+                # Start the loss window clock
+                self._oldest = time.monotonic()
+                self._cond.notify()
+            self._dirty[user_id] = score
+            if len(self._dirty) >= self.max_batch:
+                self._cond.notify()
+
+    def pending(self):
+        with self._cond:
+            return len(self._dirty)
+
+    def flush(self):
+        """
+        Writes every dirty score now. Safe to call from any thread.
+        """
+        with self._flush_lock:
+            with self._cond:
+                batch = self._dirty
+                self._dirty = {}
+                self._oldest = None
+            if not batch:
+                return 0
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                written, rejected = self._isolate(batch) if len(batch) > 1 else (0, {})
+                if written:
+                    logger.error(f"Dropped {len(rejected)} scores storage rejected: {sorted(map(repr, rejected))}")
+                    with self._cond:
+                        self.failures = 0
+                        self._retry_at = None
+                    return written
+                logger.error(f"Failed to flush {len(batch)} scores, will retry: {e}")
+                with self._cond:
+                    # Newer values recorded during the failed write win
+                    for user_id, score in batch.items():
+                        self._dirty.setdefault(user_id, score)
+                    if self._oldest is None:
+                        self._oldest = time.monotonic()
+                    backoff = min(self.max_loss_ms * 2 ** self.failures, self.max_backoff_ms)
+                    self.failures += 1
+                    self._retry_at = time.monotonic() + backoff / 1000
+                return 0
+            with self._cond:
+                self.failures = 0
+                self._retry_at = None
+            return len(batch)
+
+    def _isolate(self, batch):
+        """
+        Writes a failed batch one user at a time. Returns how many were written and the ones that failed.
+        """
+        written = 0
+        rejected = {}
+        for user_id, score in batch.items():
+            try:
+                self._write_batch({user_id: score})
+                written += 1
+            except Exception:
+                rejected[user_id] = score
+        return written, rejected
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def _run(self):
+        window = self.max_loss_ms / 1000
+        while True:
+            with self._cond:
+                while not self._closed:
+                    if self._retry_at is not None:
+                        # Backing off after a failed write, however full the batch is
+                        remaining = self._retry_at - time.monotonic()
+                        if remaining > 0:
+                            self._cond.wait(remaining)
+                            continue
+                    if len(self._dirty) >= self.max_batch:
+                        break
+                    if self._oldest is not None:
+                        remaining = self._oldest + window - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    else:
+                        self._cond.wait()
+                if self._closed:
+                    return
+            self.flush()
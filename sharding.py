@@ -0,0 +1,168 @@
+import logging
+import multiprocessing
+import sys
+import threading
+import zlib
+
+from matcher import EMPTY_MATCHER, shared_matcher
+from normaliser import normalise
+
+logger = logging.getLogger(__name__)
+
+
+def shard_for(channel_id, shards):
+    """
+    The shard that owns a channel. crc32 rather than hash() so every process agrees regardless of PYTHONHASHSEED.
+    """
+    return zlib.crc32(channel_id.encode()) % shards
+
+
+def _serve_shard(inbox, outbox, channel_words):
+    """
+    Worker process loop. Owns the matchers for its channels and returns only the messages that hit a banned word.
+    """
+    matchers = {channel: shared_matcher(words) for channel, words in channel_words.items() if words}
+    while True:
+        batch = inbox.get()
+        if batch is None:
+            return
+        hits = []
+        for item in batch:
+            if item[0] == "scan":
+                _, channel, user, ts, text = item
+                word = matchers.get(channel, EMPTY_MATCHER).first_match(normalise(text))
+                if word is not None:
+                    hits.append(((channel, user, ts), word))
+            else:
+                _, channel, words = item
+                if words:
+                    matchers[channel] = shared_matcher(words)
+                else:
+                    matchers.pop(channel, None)
+        if hits:
+            outbox.put(hits)
+
+
+class ShardRouter:
+    """
+    Spreads banned-word matching over `shards` worker processes, each owning the channels that hash to it.
+    Only the CPU-heavy part (normalising and matching) moves out; hits come back to `on_hit(message, word)` in this
+    process, which keeps scores and the leaderboard in one place. A channel always goes to the same shard, so its
+    messages and ban changes are applied in order.
+    Messages are sent in batches of up to `batch_size`, waiting at most `batch_window` seconds for one to fill.
+    """
+
+    def __init__(self, shards, channel_words, on_hit, batch_size=256, batch_window=0.002):
+        self.shards = shards
+        self.on_hit = on_hit
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self._ctx = multiprocessing.get_context("spawn")
+        self._outbox = self._ctx.Queue()
+        # Latest normalised words per channel, so a crashed shard can be restarted with current bans
+        self._words = {channel: frozenset(words) for channel, words in channel_words.items()}
+        self._pending = [[] for _ in range(shards)]
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._workers = [self._spawn(shard) for shard in range(shards)]
+        self._flusher = threading.Thread(target=self._flush_loop, name="shard-flush", daemon=True)
+        self._results = threading.Thread(target=self._result_loop, name="shard-results", daemon=True)
+        self._flusher.start()
+        self._results.start()
+
+    def _spawn(self, shard):
+        inbox = self._ctx.Queue()
+        with self._cond:
+            # update() may be changing the bans while a shard restarts from the flush thread
+            words = {channel: words for channel, words in self._words.items()
+                     if shard_for(channel, self.shards) == shard}
+        process = self._ctx.Process(target=_serve_shard, args=(inbox, self._outbox, words), name=f"shard-{shard}",
+                                    daemon=True)
+        # spawn re-imports __main__ in the child. Point it at this module so workers skip app.py's start-up.
+        main = sys.modules["__main__"]
+        sys.modules["__main__"] = sys.modules[__name__]
+        try:
+            process.start()
+        finally:
+            sys.modules["__main__"] = main
+        return process, inbox
+
+    def _queue(self, channel, item):
+        pending = self._pending[shard_for(channel, self.shards)]
+        pending.append(item)
+        if len(pending) == 1 or len(pending) >= self.batch_size:
+            self._cond.notify()
+
+    def submit(self, message):
+        """
+        Queues a Slack message event for matching. Returns immediately; hits arrive through on_hit.
+        """
+        channel = message.get("channel")
+        with self._cond:
+            self._queue(channel, ("scan", channel, message.get("user"), message.get("ts"), message.get("text", "")))
+
+    def update(self, channel, words):
+        """
+        Replaces a channel's normalised banned words on its shard.
+        """
+        words = frozenset(words)
+        with self._cond:
+            self._words[channel] = words
+            self._queue(channel, ("words", channel, words))
+
+    def pending(self):
+        with self._cond:
+            return sum(len(batch) for batch in self._pending)
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                while not self._stopped and not any(self._pending):
+                    self._cond.wait()
+                if not self._stopped and max(map(len, self._pending)) < self.batch_size:
+                    # Give the batch a moment to fill; a full one wakes us early
+                    self._cond.wait(self.batch_window)
+                batches, self._pending = self._pending, [[] for _ in range(self.shards)]
+                stopped = self._stopped
+            for shard, batch in enumerate(batches):
+                if batch:
+                    try:
+                        self._send(shard, batch)
+                    except Exception as e:
+                        # One shard failing mustn't stop enforcement in every other channel
+                        logger.error(f"Failed to send {len(batch)} messages to enforcement shard {shard}: {e}")
+            if stopped:
+                for _, inbox in self._workers:
+                    inbox.put(None)
+                return
+
+    def _send(self, shard, batch):
+        process, inbox = self._workers[shard]
+        if not process.is_alive():
+            logger.error(f"Enforcement shard {shard} exited with {process.exitcode}; restarting it")
+            self._workers[shard] = process, inbox = self._spawn(shard)
+        inbox.put(batch)
+
+    def _result_loop(self):
+        while True:
+            hits = self._outbox.get()
+            if hits is None:
+                return
+            for (channel, user, ts), word in hits:
+                try:
+                    self.on_hit({"channel": channel, "user": user, "ts": ts}, word)
+                except Exception as e:
+                    logger.error(f"Failed to apply penalty for {user} in {channel}: {e}")
+
+    def close(self, timeout=5.0):
+        """
+        Matches everything already submitted, then stops the workers.
+        """
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._flusher.join(timeout)
+        for process, _ in self._workers:
+            process.join(timeout)
+        self._outbox.put(None)
+        self._results.join(timeout)
@@ -0,0 +1,376 @@
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+from array import array
+
+from storage import Storage, reflection_key
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"WBSNAP\0\0"
+LOG_MAGIC = b"WBLOG\0\0\0"
+VERSION = 1
+# magic, version, epoch, length of the source name
+_SNAPSHOT_HEADER = struct.Struct("<8sIQI")
+# magic, epoch
+_LOG_HEADER = struct.Struct("<8sQ")
+# payload length, crc32 of the payload
+_RECORD = struct.Struct("<II")
+# Section lengths, so a reader can check the file is whole before trusting it
+_SECTIONS = struct.Struct("<QQQQQQ")
+
+
+def _pack_strings(strings):
+    """
+    Strings separated by NULs, which neither Slack IDs nor anything typed in Slack contain. Reading them back is
+    one decode and one split.
+    """
+    text = "\0".join(strings)
+    if text.count("\0") != max(len(strings) - 1, 0):
+        raise ValueError("a string to snapshot contains a NUL")
+    return text.encode()
+
+
+def _unpack_strings(view, count):
+    strings = str(view, "utf-8").split("\0") if count else []
+    if len(strings) != count:
+        raise ValueError("string count doesn't match")
+    return strings
+
+
+def _array(typecode, view):
+    values = array(typecode)
+    values.frombytes(view)
+    return values
+
+
+class SnapshotStorage(Storage):
+    """
+    Wraps another backend so restarts don't have to read it all back.
+    Every change that reaches the backend is also appended to a log. Every `interval` seconds, or sooner once the log
+    passes `max_log_bytes`, the backend's banned words, scores and pending reflections are written to one binary
+    snapshot and the log starts again empty. Start-up maps the snapshot and replays the log on top.
+    The backend stays the source of truth: if the snapshot and log don't belong together (a crash mid-checkpoint,
+    a different database, a new format) they are ignored and the caches load from the backend as before.
+    """
+
+    def __init__(self, inner, path, interval=600.0, max_log_bytes=64 * 2 ** 20):
+        self._inner = inner
+        self.path = path
+        self.log_path = f"{path}.log"
+        self.interval = interval
+        self.max_log_bytes = max_log_bytes
+        # Snapshots are only valid for the database they were taken from
+        self._source = f"{type(inner).__name__}:{os.path.abspath(getattr(inner, 'path', '.'))}"
+        self._lock = threading.Lock()
+        # One checkpoint at a time, so a snapshot is always written after the log it pairs with
+        self._checkpoint_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._checkpoint_due = False
+        # Read on first use rather than here, so opening storage doesn't hold up start-up
+        self._loaded = False
+        self._state = None
+        self._log = None
+        self._log_bytes = 0
+        self._thread = threading.Thread(target=self._run, name="snapshot", daemon=True)
+        self._thread.start()
+
+    # --- Reading back ---
+    def _ensure_loaded(self):
+        """
+        Reads the snapshot and log the first time anything needs them. Call with _lock held.
+        """
+        if self._loaded:
+            return
+        self._loaded = True
+        self._state = self._read()
+        if self._state is None:
+            # Nothing usable on disk: take a snapshot now so the next start has one
+            with self._cond:
+                self._checkpoint_due = True
+                self._cond.notify()
+        elif self._log is None:
+            self._log = open(self.log_path, "ab")
+            self._log_bytes = self._log.tell()
+
+    def _read(self):
+        """
+        The snapshot plus the log replayed on top, or None if there is no usable pair.
+        """
+        try:
+            with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                state = self._read_snapshot(memoryview(mapped))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, BufferError, struct.error) as e:
+            logger.warning(f"Ignoring unreadable snapshot {self.path}: {e}")
+            return None
+        if state is None:
+            return None
+        try:
+            with open(self.log_path, "rb") as f:
+                replayed = self._replay(f, state)
+        except FileNotFoundError:
+            replayed = None
+        if replayed is None:
+            logger.warning(f"Snapshot {self.path} and log {self.log_path} don't match; loading from storage")
+            return None
+        logger.info(f"Loaded snapshot {self.path} and replayed {replayed} logged changes")
+        return state
+
+    def _read_snapshot(self, view):
+        magic, version, epoch, source_length = _SNAPSHOT_HEADER.unpack_from(view)
+        if magic != MAGIC or version != VERSION:
+            logger.info(f"Snapshot {self.path} is from another version; loading from storage")
+            return None
+        offset = _SNAPSHOT_HEADER.size
+        source = str(view[offset:offset + source_length], "utf-8")
+        if source != self._source:
+            logger.info(f"Snapshot {self.path} was taken from {source}; loading from storage")
+            return None
+        offset += source_length
+        lengths = _SECTIONS.unpack_from(view, offset)
+        offset += _SECTIONS.size
+        if offset + sum(lengths) != len(view):
+            raise ValueError("truncated")
+        sections = []
+        for length in lengths:
+            sections.append(view[offset:offset + length])
+            offset += length
+        users, values, channels, per_channel, words, reflections = sections
+
+        values = _array("q", values)
+        scores = dict(zip(_unpack_strings(users, len(values)), values))
+        per_channel = _array("Q", per_channel)
+        channels = _unpack_strings(channels, len(per_channel))
+        words = _unpack_strings(words, sum(per_channel))
+        banned = {}
+        start = 0
+        for channel, count in zip(channels, per_channel):
+            banned[channel] = set(words[start:start + count])
+            start += count
+        pending = {reflection_key(record): record for record in json.loads(str(reflections, "utf-8"))}
+        return {"epoch": epoch, "scores": scores, "banned": banned, "reflections": pending}
+
+    def _replay(self, f, state):
+        """
+        Applies each whole record in the log to state and returns how many there were, or None if the log belongs to
+        another snapshot. A torn record at the end (a crash mid-write) is cut off.
+        """
+        header = f.read(_LOG_HEADER.size)
+        if len(header) < _LOG_HEADER.size:
+            return None
+        magic, epoch = _LOG_HEADER.unpack(header)
+        if magic != LOG_MAGIC or epoch != state["epoch"]:
+            return None
+        replayed = 0
+        good = f.tell()
+        while True:
+            head = f.read(_RECORD.size)
+            if len(head) < _RECORD.size:
+                break
+            length, crc = _RECORD.unpack(head)
+            payload = f.read(length)
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                break
+            self._apply(state, json.loads(payload))
+            replayed += 1
+            good = f.tell()
+        if good < os.path.getsize(self.log_path):
+            logger.warning(f"Dropping a partly written record at the end of {self.log_path}")
+            os.truncate(self.log_path, good)
+        return replayed
+
+    @staticmethod
+    def _apply(state, change):
+        op = change[0]
+        banned = state["banned"]
+        if op == "ban":
+            banned.setdefault(change[1], set()).add(change[2])
+        elif op == "unban":
+            words = banned.get(change[1])
+            if words is not None:
+                words.discard(change[2])
+                if not words:
+                    del banned[change[1]]
+        elif op == "reset":
+            banned.pop(change[1], None)
+        elif op == "scores":
+            state["scores"].update(change[1])
+        elif op == "reflection":
+            record = change[1]
+            if record.get("processed", False):
+                state["reflections"].pop(reflection_key(record), None)
+            else:
+                state["reflections"][reflection_key(record)] = record
+        elif op == "processed":
+            for key in change[1]:
+                state["reflections"].pop(key, None)
+
+    def _take(self, part):
+        """
+        One part of the loaded state, handed out once; later calls go to the backend.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            if self._state is None or part not in self._state:
+                return None
+            return self._state.pop(part)
+
+    # --- Writing ---
+    def _write(self, write, *change):
+        """
+        Runs write() against the backend and logs change as one step under _lock, which checkpoints also hold while
+        they read the backend, so a snapshot has either both or neither. Nothing is logged if write() returns False.
+        """
+        payload = json.dumps(change, separators=(",", ":")).encode()
+        with self._lock:
+            self._ensure_loaded()
+            result = write()
+            if result is False or self._log is None:
+                # Nothing changed, or there's no snapshot yet for a log to extend (the first checkpoint reads it)
+                return result
+            self._log.write(_RECORD.pack(len(payload), zlib.crc32(payload)) + payload)
+            self._log.flush()
+            self._log_bytes += _RECORD.size + len(payload)
+            full = self._log_bytes >= self.max_log_bytes
+        if full:
+            with self._cond:
+                self._checkpoint_due = True
+                self._cond.notify()
+        return result
+
+    def checkpoint(self):
+        """
+        Writes a fresh snapshot and empties the log.
+        """
+        with self._checkpoint_lock:
+            self._checkpoint()
+
+    def _checkpoint(self):
+        with self._lock:
+            # Writes wait while the new log starts and the backend is read, so the snapshot is exactly the state the
+            # new log begins from. Epochs are random so a snapshot and log only pair up if one checkpoint wrote both.
+            epoch = int.from_bytes(os.urandom(8), "little")
+            tmp = f"{self.log_path}.tmp"
+            log = open(tmp, "wb")
+            log.write(_LOG_HEADER.pack(LOG_MAGIC, epoch))
+            log.flush()
+            os.replace(tmp, self.log_path)
+            if self._log is not None:
+                self._log.close()
+            self._log, self._log_bytes = log, _LOG_HEADER.size
+            state = self._inner.load_scores(), self._inner.load_banned_words(), self._inner.load_pending_reflections()
+        self._write_snapshot(epoch, *state)
+
+    def _write_snapshot(self, epoch, scores, banned, reflections):
+        source = self._source.encode()
+        channels = list(banned)
+        sections = [
+            _pack_strings(list(scores)),
+            array("q", scores.values()).tobytes(),
+            _pack_strings(channels),
+            array("Q", (len(banned[channel]) for channel in channels)).tobytes(),
+            _pack_strings([word for channel in channels for word in banned[channel]]),
+            json.dumps(reflections).encode(),
+        ]
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(_SNAPSHOT_HEADER.pack(MAGIC, VERSION, epoch, len(source)))
+            f.write(source)
+            f.write(_SECTIONS.pack(*map(len, sections)))
+            for section in sections:
+                f.write(section)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        logger.info(f"Wrote snapshot {self.path}: {len(scores)} scores, {len(channels)} channels, "
+                    f"{len(reflections)} pending reflections")
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._checkpoint_due and not self._closed:
+                    self._cond.wait(self.interval)
+                if self._closed:
+                    return
+                self._checkpoint_due = False
+            try:
+                self.checkpoint()
+            except Exception as e:
+                logger.error(f"Snapshot checkpoint failed: {e}")
+
+    # --- Storage ---
+    def load_banned_words(self) -> dict:
+        banned = self._take("banned")
+        return self._inner.load_banned_words() if banned is None else banned
+
+    def ban_word(self, channel_id, word) -> bool:
+        return self._write(lambda: self._inner.ban_word(channel_id, word), "ban", channel_id, word)
+
+    def unban_word(self, channel_id, word) -> bool:
+        return self._write(lambda: self._inner.unban_word(channel_id, word), "unban", channel_id, word)
+
+    def reset_channel(self, channel_id, words=None) -> int:
+        return self._write(lambda: self._inner.reset_channel(channel_id, words), "reset", channel_id)
+
+    def load_scores(self) -> dict:
+        scores = self._take("scores")
+        return self._inner.load_scores() if scores is None else scores
+
+    def write_scores(self, batch: dict):
+        self._write(lambda: self._inner.write_scores(batch), "scores", batch)
+
+    def load_pending_reflections(self) -> list:
+        pending = self._take("reflections")
+        if pending is None:
+            return self._inner.load_pending_reflections()
+        return sorted(pending.values(), key=lambda record: record["created_at"])
+
+    def save_reflection(self, record: dict):
+        self._write(lambda: self._inner.save_reflection(record), "reflection", record)
+
+    def mark_reflections_processed(self, keys):
+        keys = list(keys)
+        self._write(lambda: self._inner.mark_reflections_processed(keys), "processed", keys)
+
+    # Sweeps are few and only read at start-up, so they aren't snapshotted
+    def load_sweeps(self) -> list:
+        return self._inner.load_sweeps()
+
+    def save_sweep(self, record: dict):
+        self._inner.save_sweep(record)
+
+    def delete_sweep(self, key):
+        self._inner.delete_sweep(key)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout=30)
+        try:
+            # Leaves nothing to replay on the next start
+            self.checkpoint()
+        except Exception as e:
+            logger.error(f"Could not write snapshot {self.path} on close: {e}")
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+        self._inner.close()
+
+
+def with_snapshot(storage):
+    """
+    Wraps storage in a SnapshotStorage unless SNAPSHOT_PATH is set to an empty string.
+    """
+    path = os.environ.get("SNAPSHOT_PATH", "word_ban.snapshot")
+    if not path:
+        return storage
+    return SnapshotStorage(storage, path, interval=float(os.environ.get("SNAPSHOT_INTERVAL", "600")))
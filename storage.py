@@ -0,0 +1,354 @@
+import dbm
+import json
+import logging
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+
+logger = logging.getLogger(__name__)
+
+# The files the bot used before it had a storage layer; SQLiteStorage imports them once
+LEGACY_BANNED_WORDS_DB = "banned_words.db"
+LEGACY_SCORES_DB = "scores.db"
+LEGACY_REFLECTIONS_DB = "reflections.db"
+# Sweeps came after the storage layer, so there's nothing to import; DbmStorage keeps them here
+DBM_SWEEPS_DB = "sweeps.db"
+
+
+def reflection_key(record: dict) -> str:
+    return f"{record['user']}:{record['created_at']}"
+
+
+def sweep_key(record: dict) -> str:
+    return f"{record['channel']}:{record['started_at']}"
+
+
+class Storage(ABC):
+    """
+    Everything the bot persists goes through one of these.
+    Banned words are keyed by (channel, word), scores by user and reflections by "user:created_at".
+    """
+
+    # --- Banned words ---
+    @abstractmethod
+    def load_banned_words(self) -> dict:
+        """Returns channel_id -> set of banned words."""
+
+    @abstractmethod
+    def ban_word(self, channel_id, word) -> bool:
+        """Bans word in the channel. Returns False if it was already banned."""
+
+    @abstractmethod
+    def unban_word(self, channel_id, word) -> bool:
+        """Unbans word in the channel. Returns False if it wasn't banned."""
+
+    @abstractmethod
+    def reset_channel(self, channel_id, words=None) -> int:
+        """
+        Unbans every word in the channel and returns how many there were.
+        words is the caller's cached set of the channel's bans; backends without a channel index use it to skip a full scan.
+        """
+
+    # --- Scores ---
+    @abstractmethod
+    def load_scores(self) -> dict:
+        ...
+
+    @abstractmethod
+    def write_scores(self, batch: dict):
+        """Persists user_id -> score for every user in batch."""
+
+    # --- Reflections ---
+    @abstractmethod
+    def load_pending_reflections(self) -> list:
+        """Returns the unprocessed reflection records, oldest first."""
+
+    @abstractmethod
+    def save_reflection(self, record: dict):
+        ...
+
+    @abstractmethod
+    def mark_reflections_processed(self, keys):
+        ...
+
+    # --- History sweeps ---
+    @abstractmethod
+    def load_sweeps(self) -> list:
+        """Returns the history sweeps that hadn't finished, oldest first."""
+
+    @abstractmethod
+    def save_sweep(self, record: dict):
+        """Checkpoints a sweep's progress, keyed by "channel:started_at"."""
+
+    @abstractmethod
+    def delete_sweep(self, key):
+        ...
+
+    def close(self):
+        pass
+
+
+class SQLiteStorage(Storage):
+    """
+    One SQLite database in WAL mode, with one long-lived connection per thread.
+    Statements are fixed strings so sqlite3's per-connection statement cache keeps them prepared.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS banned_words (
+            channel TEXT NOT NULL,
+            word TEXT NOT NULL,
+            PRIMARY KEY (channel, word)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS scores (
+            user TEXT PRIMARY KEY,
+            score INTEGER NOT NULL
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS reflections (
+            key TEXT PRIMARY KEY,
+            user TEXT NOT NULL,
+            created_at INTEGER NOT NULL,
+            processed INTEGER NOT NULL DEFAULT 0,
+            record TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS reflections_pending ON reflections (created_at) WHERE processed = 0;
+        CREATE TABLE IF NOT EXISTS sweeps (
+            key TEXT PRIMARY KEY,
+            started_at REAL NOT NULL,
+            record TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, path="word_ban.sqlite3"):
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        conn = self._conn()
+        conn.executescript(self.SCHEMA)
+        self._import_legacy_dbm()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _import_legacy_dbm(self):
+        conn = self._conn()
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'dbm_imported'").fetchone():
+            return
+        banned, scores, reflections = 0, 0, 0
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if dbm.whichdb(LEGACY_BANNED_WORDS_DB):
+                with dbm.open(LEGACY_BANNED_WORDS_DB, "r") as db:
+                    for key in db.keys():
+                        decoded = key.decode()
+                        if ":" not in decoded:
+                            logger.warning(f"Skipping invalid banned word key: {decoded}")
+                            continue
+                        conn.execute("INSERT OR IGNORE INTO banned_words (channel, word) VALUES (?, ?)",
+                                     decoded.split(":", 1))
+                        banned += 1
+            if dbm.whichdb(LEGACY_SCORES_DB):
+                with dbm.open(LEGACY_SCORES_DB, "r") as db:
+                    for k, v in db.items():
+                        conn.execute("INSERT OR REPLACE INTO scores (user, score) VALUES (?, ?)",
+                                     (k.decode(), int(v)))
+                        scores += 1
+            if dbm.whichdb(LEGACY_REFLECTIONS_DB):
+                with dbm.open(LEGACY_REFLECTIONS_DB, "r") as db:
+                    for key in db.keys():
+                        record = json.loads(db[key].decode())
+                        conn.execute(
+                            "INSERT OR REPLACE INTO reflections (key, user, created_at, processed, record) VALUES (?, ?, ?, ?, ?)",
+                            (key.decode(), record["user"], record["created_at"], int(record.get("processed", False)),
+                             json.dumps(record)))
+                        reflections += 1
+            conn.execute("INSERT INTO meta (key, value) VALUES ('dbm_imported', '1')")
+        if banned or scores or reflections:
+            logger.info(f"Imported {banned} banned words, {scores} scores and {reflections} reflections from dbm")
+
+    # --- Banned words ---
+    def load_banned_words(self) -> dict:
+        cache = {}
+        for chan, word in self._conn().execute("SELECT channel, word FROM banned_words"):
+            cache.setdefault(chan, set()).add(word)
+        return cache
+
+    def ban_word(self, channel_id, word) -> bool:
+        cur = self._conn().execute("INSERT OR IGNORE INTO banned_words (channel, word) VALUES (?, ?)",
+                                   (channel_id, word))
+        return cur.rowcount > 0
+
+    def unban_word(self, channel_id, word) -> bool:
+        cur = self._conn().execute("DELETE FROM banned_words WHERE channel = ? AND word = ?", (channel_id, word))
+        return cur.rowcount > 0
+
+    def reset_channel(self, channel_id, words=None) -> int:
+        cur = self._conn().execute("DELETE FROM banned_words WHERE channel = ?", (channel_id,))
+        return cur.rowcount
+
+    # --- Scores ---
+    def load_scores(self) -> dict:
+        return dict(self._conn().execute("SELECT user, score FROM scores"))
+
+    def write_scores(self, batch: dict):
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN")
+            conn.executemany("INSERT OR REPLACE INTO scores (user, score) VALUES (?, ?)", batch.items())
+
+    # --- Reflections ---
+    def load_pending_reflections(self) -> list:
+        # Served by the partial reflections_pending index, so processed history is never read
+        rows = self._conn().execute("SELECT record FROM reflections WHERE processed = 0 ORDER BY created_at")
+        return [json.loads(record) for (record,) in rows]
+
+    def save_reflection(self, record: dict):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO reflections (key, user, created_at, processed, record) VALUES (?, ?, ?, ?, ?)",
+            (reflection_key(record), record["user"], record["created_at"], int(record.get("processed", False)),
+             json.dumps(record)))
+
+    def mark_reflections_processed(self, keys):
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "UPDATE reflections SET processed = 1, record = json_set(record, '$.processed', json('true')) WHERE key = ?",
+                [(key,) for key in keys])
+
+    # --- History sweeps ---
+    def load_sweeps(self) -> list:
+        rows = self._conn().execute("SELECT record FROM sweeps ORDER BY started_at")
+        return [json.loads(record) for (record,) in rows]
+
+    def save_sweep(self, record: dict):
+        self._conn().execute("INSERT OR REPLACE INTO sweeps (key, started_at, record) VALUES (?, ?, ?)",
+                             (sweep_key(record), record["started_at"], json.dumps(record)))
+
+    def delete_sweep(self, key):
+        self._conn().execute("DELETE FROM sweeps WHERE key = ?", (key,))
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+class DbmStorage(Storage):
+    """
+    The original three dbm files, opened per call. Kept for hosts that want to stay on them.
+    """
+
+    def load_banned_words(self) -> dict:
+        cache = {}
+        with dbm.open(LEGACY_BANNED_WORDS_DB, "c") as db:
+            for key in db.keys():
+                decoded = key.decode()
+                if ":" not in decoded:
+                    logger.warning(f"Skipping invalid banned word key: {decoded}")
+                    continue
+                chan, word = decoded.split(":", 1)
+                cache.setdefault(chan, set()).add(word)
+        return cache
+
+    def ban_word(self, channel_id, word) -> bool:
+        with dbm.open(LEGACY_BANNED_WORDS_DB, "c") as db:
+            key = f"{channel_id}:{word}"
+            if key in db:
+                return False
+            db[key] = "banned"
+            return True
+
+    def unban_word(self, channel_id, word) -> bool:
+        with dbm.open(LEGACY_BANNED_WORDS_DB, "c") as db:
+            key = f"{channel_id}:{word}"
+            if key not in db:
+                return False
+            del db[key]
+            return True
+
+    def reset_channel(self, channel_id, words=None) -> int:
+        with dbm.open(LEGACY_BANNED_WORDS_DB, "c") as db:
+            if words is None:
+                prefix = f"{channel_id}:".encode()
+                keys = [key for key in db.keys() if key.startswith(prefix)]
+            else:
+                keys = [f"{channel_id}:{word}".encode() for word in words]
+            removed = 0
+            for key in keys:
+                if key in db:
+                    del db[key]
+                    removed += 1
+        return removed
+
+    def load_scores(self) -> dict:
+        with dbm.open(LEGACY_SCORES_DB, "c") as db:
+            return {k.decode(): int(v) for k, v in db.items()}
+
+    def write_scores(self, batch: dict):
+        with dbm.open(LEGACY_SCORES_DB, "c") as db:
+            for user_id, score in batch.items():
+                db[user_id] = str(score)
+
+    def load_pending_reflections(self) -> list:
+        loaded = []
+        with dbm.open(LEGACY_REFLECTIONS_DB, "c") as db:
+            for key in db.keys():
+                record = json.loads(db[key].decode())
+                if not record.get("processed", False):
+                    loaded.append(record)
+        return loaded
+
+    def save_reflection(self, record: dict):
+        with dbm.open(LEGACY_REFLECTIONS_DB, "c") as db:
+            db[reflection_key(record)] = json.dumps(record)
+
+    def mark_reflections_processed(self, keys):
+        with dbm.open(LEGACY_REFLECTIONS_DB, "c") as db:
+            for key in keys:
+                if key.encode() in db:
+                    record = json.loads(db[key].decode())
+                    record["processed"] = True
+                    db[key] = json.dumps(record)
+
+    def load_sweeps(self) -> list:
+        with dbm.open(DBM_SWEEPS_DB, "c") as db:
+            records = [json.loads(db[key].decode()) for key in db.keys()]
+        return sorted(records, key=lambda record: record["started_at"])
+
+    def save_sweep(self, record: dict):
+        with dbm.open(DBM_SWEEPS_DB, "c") as db:
+            db[sweep_key(record)] = json.dumps(record)
+
+    def delete_sweep(self, key):
+        with dbm.open(DBM_SWEEPS_DB, "c") as db:
+            if key.encode() in db:
+                del db[key]
+
+
+def open_storage() -> Storage:
+    """
+    Picks the backend from STORAGE_BACKEND ("sqlite" by default, or "dbm").
+    """
+    backend = os.environ.get("STORAGE_BACKEND", "sqlite").lower()
+    if backend == "sqlite":
+        return SQLiteStorage(os.environ.get("STORAGE_PATH", "word_ban.sqlite3"))
+    if backend == "dbm":
+        return DbmStorage()
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
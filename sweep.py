@@ -0,0 +1,147 @@
+import logging
+import queue
+import threading
+import time
+
+from slack_sdk.errors import SlackApiError
+
+from matcher import BannedWordMatcher
+from normaliser import normalise
+from outbound import retry_after
+from storage import sweep_key
+
+logger = logging.getLogger(__name__)
+
+# conversations.history returns at most this many messages a page
+PAGE_SIZE = 200
+
+
+class HistorySweeper:
+    """
+    Looks back through a channel's history for words that have just been banned.
+    Sweeps run one at a time on a background thread. Each reads conversations.history a page at a time, newest first,
+    keeping only per-user counts, so memory doesn't grow with the history. After every page the cursor and counts
+    are checkpointed with `save(record)`, so a sweep interrupted by a restart carries on from there.
+    Requests are paced by `bucket` (conversations.history is tier 3) and a 429 pauses it for Retry-After.
+    `on_done(record)` gets the finished sweep: its channel, words and `hits` ({user: messages}).
+    """
+
+    def __init__(self, client, bucket, save, delete, on_done):
+        self._client = client
+        self._bucket = bucket
+        self._save = save
+        self._delete = delete
+        self._on_done = on_done
+        self._queue = queue.Queue()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="history-sweep", daemon=True)
+        self._thread.start()
+
+    def start(self, channel_id, words, requested_by, days, penalise=False):
+        """
+        Queues a sweep of the last `days` days of the channel for `words` (already normalised).
+        Messages from now on are left to live enforcement.
+        """
+        now = time.time()
+        record = {
+            "channel": channel_id,
+            "words": sorted(words),
+            "requested_by": requested_by,
+            "penalise": penalise,
+            "started_at": now,
+            "oldest": f"{now - days * 86400:.6f}",
+            "latest": f"{now:.6f}",
+            "cursor": None,
+            # ts of the oldest message seen, to carry on from if the cursor has expired
+            "before": None,
+            "scanned": 0,
+            "hits": {},
+        }
+        self._save(record)
+        self._queue.put(record)
+        return record
+
+    def resume(self, records):
+        """
+        Carries on with sweeps that were checkpointed before a restart.
+        """
+        for record in records:
+            self._queue.put(record)
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            if record is None:
+                return
+            try:
+                finished = self._sweep(record)
+            except Exception as e:
+                # The checkpoint stays, so the sweep is picked up again on the next start
+                logger.error(f"History sweep of {record['channel']} failed after {record['scanned']} messages: {e}")
+                continue
+            if not finished:
+                return
+            self._delete(sweep_key(record))
+            try:
+                self._on_done(record)
+            except Exception as e:
+                logger.error(f"Could not report history sweep of {record['channel']}: {e}")
+
+    def _page(self, record):
+        args = {"channel": record["channel"], "oldest": record["oldest"], "latest": record["latest"],
+                "limit": PAGE_SIZE}
+        if record["cursor"]:
+            args["cursor"] = record["cursor"]
+        while True:
+            self._bucket.acquire()
+            try:
+                return self._client.conversations_history(**args)
+            except SlackApiError as e:
+                wait = retry_after(e)
+                if wait is not None:
+                    self._bucket.pause(wait)
+                    continue
+                if e.response.get("error") == "invalid_cursor" and "cursor" in args:
+                    # Cursors expire; carry on from the oldest message seen without one
+                    # (and from then on, so later cursors match the query they came from)
+                    del args["cursor"]
+                    args["latest"] = record["latest"] = record["before"] or record["latest"]
+                    continue
+                raise
+
+    def _sweep(self, record):
+        """
+        Runs a sweep to the end and returns True, or returns False if the sweeper was closed first.
+        """
+        matcher = BannedWordMatcher(record["words"])
+        hits = record["hits"]
+        while True:
+            if self._stopped.is_set():
+                # Shutting down: the last checkpoint is where the next start carries on
+                return False
+            response = self._page(record)
+            messages = response.get("messages", [])
+            for message in messages:
+                user = message.get("user")
+                if user is None or message.get("bot_id"):
+                    continue
+                # Same normalising and matching as live messages
+                if matcher.first_match(normalise(message.get("text", ""))) is not None:
+                    hits[user] = hits.get(user, 0) + 1
+            record["scanned"] += len(messages)
+            if messages:
+                # Newest first, so the last message is the oldest seen
+                record["before"] = messages[-1]["ts"]
+            cursor = (response.get("response_metadata") or {}).get("next_cursor")
+            record["cursor"] = cursor or None
+            if not cursor or not response.get("has_more", bool(cursor)):
+                return True
+            self._save(record)
+
+    def close(self, timeout=5.0):
+        self._stopped.set()
+        self._queue.put(None)
+        self._thread.join(timeout)
@@ -0,0 +1,48 @@
+import asyncio
+
+from ai_gateway import AIGateway, CircuitBreaker, Provider
+
+
+def half_open_provider(name, acall):
+    breaker = CircuitBreaker(threshold=1, cooldown=0.0)
+    breaker.failure()
+    return Provider(name, call=None, acall=acall, breaker=breaker)
+
+
+async def hang(text, timeout):
+    await asyncio.sleep(10)
+
+
+async def answer(text, timeout):
+    return "hi"
+
+
+def test_async_deadline_counts_as_a_failure():
+    provider = Provider("slow", call=None, acall=hang, breaker=CircuitBreaker(threshold=1, cooldown=60.0))
+    gateway = AIGateway([provider], deadline=0.1, fallback="fallback")
+    assert asyncio.run(gateway.arequest("hello")) == "fallback"
+    assert provider.counts["errors"] == 1
+    assert provider.breaker.state == "open"
+
+
+def test_half_open_trial_is_freed_when_its_call_runs_past_the_deadline():
+    provider = half_open_provider("slow", hang)
+    gateway = AIGateway([provider], deadline=0.1, fallback="fallback")
+    assert asyncio.run(gateway.arequest("hello")) == "fallback"
+    provider.acall = answer
+    assert asyncio.run(gateway.arequest("hello")) == "hi"
+    assert provider.breaker.state == "closed"
+
+
+def test_half_open_trial_is_freed_when_the_request_is_cancelled():
+    provider = half_open_provider("slow", hang)
+    gateway = AIGateway([provider], deadline=5.0, fallback="fallback")
+
+    async def cancel_midway():
+        request = asyncio.ensure_future(gateway.arequest("hello"))
+        await asyncio.sleep(0.05)
+        request.cancel()
+        await asyncio.gather(request, return_exceptions=True)
+
+    asyncio.run(cancel_midway())
+    assert provider.breaker.allow()
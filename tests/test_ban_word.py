@@ -0,0 +1,110 @@
+import time
+
+import pytest
+
+
+class RecordingClient:
+    """
+    Stands in for the Slack client behind the outbound dispatcher, so tests never reach slack.com.
+    """
+
+    def __init__(self):
+        self.posted = []
+
+    def chat_postMessage(self, **kwargs):
+        self.posted.append(kwargs)
+
+
+@pytest.fixture(scope="module")
+def app(tmp_path_factory):
+    workdir = tmp_path_factory.mktemp("app")
+    # Undone after this module, so later test modules see the original cwd and environment
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(workdir)
+        for name, value in {
+            "SLACK_BOT_TOKEN": "xoxb-test",
+            "SLACK_TOKEN_VERIFICATION": "0",
+            "AI_TOKEN1": "test",
+            "AI_TOKEN2": "test",
+            "STORAGE_BACKEND": "sqlite",
+            "STORAGE_PATH": str(workdir / "test.sqlite3"),
+            "SNAPSHOT_PATH": "",
+        }.items():
+            mp.setenv(name, value)
+        import app
+
+        app.caches_ready.wait()
+        mp.setattr(app.outbound, "client", RecordingClient())
+        yield app
+
+
+def ban(app, channel_id, text):
+    replies = []
+    app.ban_word(ack=lambda: None, command={"text": text}, respond=replies.append,
+                 body={"user_id": "UMOD", "channel_id": channel_id})
+    return replies[-1]
+
+
+@pytest.mark.parametrize("text", ["a.", ":)", "ab", "a-b", "::", "..."])
+def test_words_too_short_after_normalising_are_rejected(app, text):
+    reply = ban(app, "CSHORT", text)
+    assert reply.startswith("Please provide")
+    assert "CSHORT" not in app.banned_words_cache
+    assert app.storage.load_banned_words().get("CSHORT") is None
+
+
+def test_short_bans_dont_penalise_ordinary_chat(app):
+    ban(app, "CCHAT", "a.")
+    ban(app, "CCHAT", ":)")
+    assert app.enforce_message("CCHAT", "UCHAT", "have a nice day :)") is None
+
+
+def test_words_and_emoji_can_be_banned(app):
+    assert ban(app, "CBAN", "hot dog") == "The word 'hot dog' has been banned."
+    assert ban(app, "CBAN", ":ok:") == "The word ':ok:' has been banned."
+    assert app.banned_words_cache.get("CBAN") == {"hotdog", ":ok:"}
+    assert app.enforce_message("CBAN", "UBAN", "I love hot-dogs")[0] == "hotdog"
+
+
+def test_edits_dont_block_later_penalties_from_persisting(app):
+    ban(app, "CEDIT", "sausage")
+    edited = {"type": "message", "subtype": "message_changed", "channel": "CEDIT", "ts": "2.0",
+              "message": {"user": "UEDIT", "text": "sausage"}}
+    said = {"type": "message", "channel": "CEDIT", "user": "UEDIT", "ts": "3.0", "text": "sausage roll"}
+    for message in (edited, said):
+        app.handle_message_events(logger=app.logger, message=message, say=None, client=None)
+    app.score_journal.flush()
+    assert app.score_journal.pending() == 0
+    assert app.storage.load_scores()["UEDIT"] == -1
+    deadline = time.monotonic() + 5
+    while not app.outbound.client.posted and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert app.outbound.client.posted == [{"channel": "CEDIT", "text": app.penalty_text("sausage", -1),
+                                           "thread_ts": "3.0"}]
+
+
+@pytest.mark.parametrize("text", ["hot dog", "hotdog"])
+def test_unban_removes_words_stored_before_normalising(app, text):
+    channel_id = f"CRAW{text.replace(' ', '')}{len(text)}"
+    for raw in ("hot dog", "don't"):
+        app.storage.ban_word(channel_id, raw)
+    with app.banned_lock:
+        app.banned_words_cache.update({channel_id: {"hot dog", "don't"}})
+        app.rebuild_matcher(channel_id)
+    replies = []
+    app.unban_word(ack=lambda: None, command={"text": text}, respond=replies.append,
+                   body={"user_id": "UMOD", "channel_id": channel_id})
+    assert replies == [f"The word '{text}' was unbanned."]
+    assert app.banned_words_cache.get(channel_id) == {"don't"}
+    assert app.storage.load_banned_words()[channel_id] == {"don't"}
+    assert app.enforce_message(channel_id, "URAW", "hot dogs") is None
+
+
+def test_sweeping_an_existing_ban_doesnt_penalise_again(app, monkeypatch):
+    started = []
+    monkeypatch.setattr(app, "SWEEP_PENALISE", True)
+    monkeypatch.setattr(app.history_sweeper, "start",
+                        lambda channel_id, words, requested_by, days, penalise=False: started.append(penalise))
+    assert "Nobody loses points" not in ban(app, "CSWEEP", "pickle --sweep")
+    assert "Nobody loses points" in ban(app, "CSWEEP", "pickle --sweep")
+    assert started == [True, False]
@@ -0,0 +1,38 @@
+import pytest
+
+from intents import classify_intent
+
+
+@pytest.mark.parametrize("text, intent", [
+    ("unban word", "UNBAN_WORD"),
+    ("how do I unban a word?", "UNBAN_WORD"),
+    ("please unban the word", "UNBAN_WORD"),
+    ("unban word dog", "UNBAN_WORD"),
+    ("ban a word", "BAN_WORD"),
+    ("how can i ban a word", "BAN_WORD"),
+    ("banned words", "BANNED_WORDS"),
+    ("show me the banned words", "BANNED_WORDS"),
+    ("what's banned here?", "BANNED_WORDS"),
+    ("which words are banned in this channel", "BANNED_WORDS"),
+    ("leaderboard", "LEADERBOARD"),
+    ("show the leaderboard", "LEADERBOARD"),
+    ("who is the most naughty?", "LEADERBOARD"),
+    ("what's my score", "SCORE"),
+    ("reflect", "REFLECT"),
+    ("help", "HELP"),
+])
+def test_commands(text, intent):
+    assert classify_intent(text) == intent
+
+
+@pytest.mark.parametrize("text", [
+    "can you unban my friend lol",
+    "I hate the leaderboard",
+    "the leaderboard is rigged",
+    "why are banned words so annoying",
+    "I think the banned list is too long",
+    "is the top 10 updated daily",
+    "what is my score and why is it so low",
+])
+def test_chat_mentioning_a_command_is_left_to_the_ai(text):
+    assert classify_intent(text) is None
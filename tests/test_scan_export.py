@@ -0,0 +1,49 @@
+import argparse
+import sqlite3
+
+import pytest
+
+import scan_export
+
+
+def args(path):
+    return argparse.Namespace(storage_path=str(path))
+
+
+def test_load_bans_reads_without_writing(tmp_path):
+    path = tmp_path / "bot.sqlite3"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE banned_words (channel TEXT, word TEXT)")
+    conn.executemany("INSERT INTO banned_words VALUES (?, ?)", [("C1", "dog"), ("C1", "cat"), ("C2", "dog")])
+    conn.commit()
+    conn.close()
+    before = path.read_bytes()
+    assert scan_export.load_bans(args(path)) == {"C1": {"dog", "cat"}, "C2": {"dog"}}
+    assert path.read_bytes() == before
+
+
+def test_load_bans_exits_without_a_database(tmp_path):
+    path = tmp_path / "missing.sqlite3"
+    with pytest.raises(SystemExit) as e:
+        scan_export.load_bans(args(path))
+    assert "No database" in str(e.value.code)
+    assert not path.exists()
+
+
+def test_load_bans_exits_without_a_ban_list(tmp_path):
+    path = tmp_path / "other.sqlite3"
+    sqlite3.connect(path).close()
+    path.write_bytes(b"")
+    with pytest.raises(SystemExit) as e:
+        scan_export.load_bans(args(path))
+    assert "Could not read banned words" in str(e.value.code)
+
+
+def test_load_bans_exits_with_no_bans(tmp_path):
+    path = tmp_path / "bot.sqlite3"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE banned_words (channel TEXT, word TEXT)")
+    conn.close()
+    with pytest.raises(SystemExit) as e:
+        scan_export.load_bans(args(path))
+    assert "No banned words" in str(e.value.code)
@@ -0,0 +1,62 @@
+import time
+
+from score_journal import ScoreJournal
+
+
+def test_failed_flush_backs_off_instead_of_spinning():
+    attempts = []
+
+    def failing_write(batch):
+        if len(batch) > 1:
+            # Single-user writes are the failed batch being retried one by one
+            attempts.append(dict(batch))
+        raise OSError("storage is down")
+
+    journal = ScoreJournal(failing_write, max_loss_ms=50, max_batch=5)
+    for i in range(10):
+        journal.record(f"U{i}", -i)
+    time.sleep(0.5)
+    # Backing off from 50 ms and doubling allows a handful of attempts in half a second, not thousands
+    assert 1 <= len(attempts) <= 6
+    assert journal.pending() == 10
+    journal.close()
+
+
+def test_scores_are_written_once_storage_recovers():
+    written = {}
+    down = [True]
+
+    def flaky_write(batch):
+        if down[0]:
+            raise OSError("storage is down")
+        written.update(batch)
+
+    journal = ScoreJournal(flaky_write, max_loss_ms=20, max_batch=1)
+    journal.record("U1", -1)
+    time.sleep(0.05)
+    down[0] = False
+    journal.record("U1", -2)
+    deadline = time.monotonic() + 2
+    while journal.pending() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert written == {"U1": -2}
+    assert journal.failures == 0
+    journal.close()
+
+
+def test_bad_keys_are_dropped_instead_of_blocking_the_journal():
+    written = {}
+
+    def strict_write(batch):
+        if None in batch:
+            raise ValueError("NOT NULL constraint failed: scores.user")
+        written.update(batch)
+
+    journal = ScoreJournal(strict_write, max_loss_ms=0)
+    journal.record(None, 0)
+    journal.record("U1", -1)
+    assert journal.pending() == 0
+    journal.record("U2", -1)
+    assert written == {"U1": -1, "U2": -1}
+    assert journal.failures == 0
+    journal.close()
@@ -0,0 +1,63 @@
+import threading
+
+from snapshot import SnapshotStorage
+from storage import SQLiteStorage
+
+
+def open_snapshot(tmp_path):
+    return SnapshotStorage(SQLiteStorage(str(tmp_path / "db.sqlite3")), str(tmp_path / "caches.snapshot"),
+                           interval=3600)
+
+
+def load_all(storage):
+    return storage.load_scores(), storage.load_banned_words(), storage.load_pending_reflections()
+
+
+def test_restart_replays_log_written_after_snapshot(tmp_path):
+    storage = open_snapshot(tmp_path)
+    load_all(storage)
+    storage.checkpoint()
+    storage.write_scores({"U1": -3, "U2": 0})
+    storage.ban_word("C1", "dog")
+    storage.ban_word("C2", "cat")
+    storage.unban_word("C2", "cat")
+    storage.save_reflection({"user": "U1", "created_at": 5, "text": "sorry"})
+    storage.save_reflection({"user": "U2", "created_at": 6, "text": "oops"})
+    storage.mark_reflections_processed(["U1:5"])
+    # No close(): as if the process had been killed
+    restarted = open_snapshot(tmp_path)
+    scores, banned, reflections = load_all(restarted)
+    assert scores == {"U1": -3, "U2": 0}
+    assert banned == {"C1": {"dog"}}
+    assert reflections == [{"user": "U2", "created_at": 6, "text": "oops"}]
+    restarted.close()
+
+
+def test_snapshot_matches_backend_when_checkpoints_race_writes(tmp_path):
+    storage = open_snapshot(tmp_path)
+    load_all(storage)
+    storage.checkpoint()
+    stop = threading.Event()
+
+    def write(user):
+        score = 0
+        while not stop.is_set():
+            score -= 1
+            storage.write_scores({user: score})
+            storage.ban_word(f"C{user}", f"word{-score % 7}")
+            storage.unban_word(f"C{user}", f"word{(-score + 3) % 7}")
+
+    writers = [threading.Thread(target=write, args=(f"U{i}",)) for i in range(4)]
+    for writer in writers:
+        writer.start()
+    for _ in range(10):
+        storage.checkpoint()
+    stop.set()
+    for writer in writers:
+        writer.join()
+
+    restarted = open_snapshot(tmp_path)
+    backend = SQLiteStorage(str(tmp_path / "db.sqlite3"))
+    assert load_all(restarted) == load_all(backend)
+    backend.close()
+    restarted.close()